@@ -32,6 +32,7 @@ setup(
         "sugarui",
         "sugarui.windows",
         "sugarui.widgets",
+        "sugarui.devel",
     ],
     url='https://github.com/sugarsack/sugar-ui',
     license='MIT',
@@ -45,6 +46,9 @@ setup(
         "pyyaml",
         "requests",
     ],
+    extras_require={
+        "msgpack": ["msgpack"],
+    },
     include_package_data=True,
     classifiers=[
         'Intended Audience :: Developers',
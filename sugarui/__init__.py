@@ -5,12 +5,15 @@ This meant to be imported by the main Sugar app
 and run as a sub-app from the nested command-line.
 """
 
+import os
 import npyscreen
 from sugarui.windows.jobmanager import JobManager
 from sugarui.windows.sysoverview import SystemOverviewForm
 from sugarui.windows.statemanager import StateManagerForm
 from sugarui.windows.modrunner import ModuleRunnerForm
+from sugarui.windows.apistats import APIStatsForm
 from sugarui.apiconnector import SugarAPIClient
+from sugarui.dispatcher import UIDispatcher
 from sugar.config import get_config
 
 
@@ -18,13 +21,19 @@ class SugarUI(npyscreen.StandardApp):
     """
     Sugar UI class.
     """
+    SNAPSHOT_FILE = "~/.cache/sugar/ui-snapshot.db"
+    STATS_FILE = "~/.cache/sugar/ui-stats.jsonl"  # Overridden by SUGAR_UI_STATS_FILE, empty value disables the dump
+
     def __init__(self):
         npyscreen.StandardApp.__init__(self)
         self._app_name = "Sugar"
         self._forms = [
             # (id, class, args, keywords, title, shortcut, classname)
         ]
-        self.api = SugarAPIClient(get_config())
+        stats_file = os.environ.get("SUGAR_UI_STATS_FILE", self.STATS_FILE)
+        self.api = SugarAPIClient(get_config(), snapshot_file=os.path.expanduser(self.SNAPSHOT_FILE),
+                                  stats_file=os.path.expanduser(stats_file) if stats_file else None)
+        self.dispatcher = UIDispatcher()  # UI calls of all the forms, so a hidden form does not block the producers
 
     def register_form(self, fid, cls, *args, **keywords):
         """
@@ -73,4 +82,7 @@ class SugarUI(npyscreen.StandardApp):
                            title="State Manager", shortcut="^T", name="State Manager")
         self.register_form(ModuleRunnerForm.id, ModuleRunnerForm,
                            title="Module Runner", shortcut="^T", name="Module Runner")
+        self.register_form(APIStatsForm.id, APIStatsForm,
+                           title="API Stats", shortcut="^S", name="API Stats")
         self.init_forms()
+        self.api.events.start()
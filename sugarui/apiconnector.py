@@ -2,84 +2,1683 @@
 """
 API connector to the Sugar API core.
 """
+import os
+import re
+import sys
 import http
+import bisect
+import json
+import time
+import socket
+import sqlite3
+import codecs
+import itertools
+import threading
+import collections
 import urllib.parse
+import concurrent.futures
 import requests
+import requests.adapters
 import sugarui.exceptions
+from sugarui.snapshot import Snapshot
 from sugar.utils.objects import Singleton
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 # from twisted.internet.threads import deferToThread
 
+MIME_JSON = "application/json"
+MIME_MSGPACK = "application/msgpack"
+
+
+class JSONStreamReader:
+    """
+    Incremental reader of JSON tokens from the chunks of a response body.
+    Only as much of the body is kept in memory, as the current value needs.
+    """
+    _WS = re.compile(r"\s*")
+
+    def __init__(self, chunks):
+        """
+        :param chunks: iterable of the body bytes
+        """
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buff = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """
+        Read next chunk into the buffer, dropping already consumed data.
+
+        :return: False at the end of the stream
+        """
+        if self._eof:
+            return False
+        try:
+            chunk = self._text.decode(next(self._chunks))
+        except StopIteration:
+            self._eof = True
+            chunk = self._text.decode(b"", final=True)
+        self._buff = self._buff[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return next character without consuming it.
+
+        :return: character
+        """
+        while True:
+            self._pos = self._WS.match(self._buff, self._pos).end()
+            if self._pos < len(self._buff):
+                return self._buff[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def expect(self, char) -> None:
+        """
+        Consume expected character.
+
+        :param char: character
+        :return: None
+        """
+        if self.peek() != char:
+            raise ValueError("Expected '{}' but got '{}' in JSON stream".format(char, self.peek()))
+        self._pos += 1
+
+    def value(self):
+        """
+        Decode next complete JSON value.
+
+        :return: decoded object
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buff, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of buffer might be not complete yet
+            if end == len(self._buff) and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+
+def iter_json_mapping(chunks, key, others=None):
+    """
+    Iterate over members of the mapping under the key
+    of the top-level JSON object, while it is still being downloaded.
+
+    Example:
+
+        iter_json_mapping(response.iter_content(), "systems")
+
+    :param chunks: iterable of the body bytes
+    :param key: key of the mapping in the top-level object
+    :param others: dict to put the other members of the top-level object to, e.g. "revision"
+    :return: generator of (name, value) tuples
+    """
+    reader = JSONStreamReader(chunks)
+    reader.expect("{")
+    while reader.peek() != "}":
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            reader.expect("{")
+            while reader.peek() != "}":
+                member = reader.value()
+                reader.expect(":")
+                yield member, reader.value()
+                if reader.peek() == ",":
+                    reader.expect(",")
+            reader.expect("}")
+        elif others is not None:
+            others[name] = reader.value()
+        else:
+            reader.value()
+        if reader.peek() == ",":
+            reader.expect(",")
+
+
+def iter_server_events(chunks):
+    """
+    Parse Server-Sent Events stream.
+
+    :param chunks: iterable of the stream bytes
+    :return: generator of (id, event, data, retry) tuples. Only "retry" (seconds) is set
+             for the "retry" field, data is None then. ID is None, if the event has no ID.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buff = ""
+    event_id, event, data = None, None, []
+    for chunk in chunks:
+        buff += decoder.decode(chunk)
+        lines = re.split("\r\n|\r|\n", buff)
+        if buff.endswith("\r"):
+            lines[-2:] = [lines[-2] + "\r"]  # CR might be followed by LF in the next chunk
+        buff = lines.pop()
+        for line in lines:
+            if not line:
+                if data:
+                    yield event_id, event or "message", "\n".join(data), None
+                event_id, event, data = None, None, []
+                continue
+            field, _, value = line.partition(":")
+            if value.startswith(" "):
+                value = value[1:]
+            if field == "data":
+                data.append(value)
+            elif field == "event":
+                event = value
+            elif field == "id" and "\0" not in value:
+                event_id = value
+            elif field == "retry" and value.isdigit():
+                yield None, None, None, int(value) / 1000
+    if buff == "\r" and data:  # Stream ends by the blank line, its CR was waiting for LF
+        yield event_id, event or "message", "\n".join(data), None
+
+
+class SingleFlight:
+    """
+    Coalescing of concurrent identical calls.
+
+    While a call with some key is in flight, all other callers with
+    the same key wait for it and get its result (or its exception),
+    instead of doing the same call again.
+    """
+    def __init__(self, enabled=True):
+        """
+        :param enabled: coalesce the calls. Disabled one makes every call (e.g. to load the master).
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._calls = 0
+        self._shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Call the function, unless an identical call is already in flight.
+
+        :param key: hashable key of the call
+        :param func: callable
+        :param args: arguments to the callable
+        :param kwargs: keywords to the callable
+        :return: result of the callable
+        """
+        if not self.enabled:
+            with self._lock:
+                self._calls += 1
+            return func(*args, **kwargs)
+
+        with self._lock:
+            self._calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._shared += 1
+                leader = False
+            else:
+                future = self._in_flight[key] = concurrent.futures.Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as ex:
+            self._done(key)
+            future.set_exception(ex)
+            raise
+        self._done(key)
+        future.set_result(result)
+
+        return result
+
+    def _done(self, key) -> None:
+        """
+        Call is finished, next identical calls should be made again.
+
+        :param key: key of the call
+        :return: None
+        """
+        with self._lock:
+            del self._in_flight[key]
+
+    def get_stats(self) -> dict:
+        """
+        Get counters of the calls.
+
+        :return: dict of all calls, calls saved by sharing and currently in flight
+        """
+        with self._lock:
+            return {"calls": self._calls, "shared": self._shared, "in_flight": len(self._in_flight)}
+
+
+class ResponseCache:
+    """
+    Cache of decoded API responses.
+
+    Each entry keeps the decoded object and its validators (ETag, Last-Modified).
+    While the entry is fresh (TTL of the URI), it is returned without any request.
+    Expired entries are revalidated with a conditional request, and the "304 Not Modified"
+    response returns the already decoded object.
+
+    Cache is bounded by the number of entries and by the response bytes.
+    Least recently used entries are evicted first. Decoded objects take several times
+    the response bytes, so the big documents, which callers keep in their own compact form
+    (e.g. the inventory), are not cached at all.
+    """
+    class Entry:
+        """
+        Cached response.
+        """
+        def __init__(self, obj, size, etag=None, last_modified=None, expires=0):
+            self.obj = obj
+            self.size = size
+            self.etag = etag
+            self.last_modified = last_modified
+            self.expires = expires
+
+        def is_fresh(self) -> bool:
+            """
+            Entry is still within its TTL.
+
+            :return: bool
+            """
+            return time.monotonic() < self.expires
+
+        def get_validators(self) -> dict:
+            """
+            Get headers for the conditional request.
+
+            :return: dict
+            """
+            headers = {}
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+            return headers
+
+    def __init__(self, ttl=None, max_entries=256, max_bytes=0x2000000, uncached=()):
+        """
+        :param ttl: mapping of URI prefix to TTL seconds, e.g. {"/jobs/history": 5}
+        :param max_entries: maximum of cached responses
+        :param max_bytes: maximum of cached response bytes
+        :param uncached: URIs, which responses are never cached
+        """
+        self._ttl = dict(ttl or {})
+        self._uncached = frozenset(uncached)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_ttl(self, uri) -> float:
+        """
+        Get TTL of the URI by its longest configured prefix.
+
+        :param uri: URI of the resource
+        :return: seconds
+        """
+        ttl = 0
+        prefix_len = -1
+        for prefix, seconds in self._ttl.items():
+            if uri.startswith(prefix) and len(prefix) > prefix_len:
+                ttl, prefix_len = seconds, len(prefix)
+        return ttl
+
+    def is_cached(self, uri) -> bool:
+        """
+        Responses of the URI are cached.
+
+        :param uri: URI of the resource
+        :return: bool
+        """
+        return uri not in self._uncached
+
+    def get(self, key) -> 'ResponseCache.Entry':
+        """
+        Get cache entry.
+
+        :param key: request key
+        :return: Entry or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: 'ResponseCache.Entry') -> None:
+        """
+        Add an entry to the cache, evicting the least recently used ones over the limits.
+
+        :param key: request key
+        :param entry: Entry
+        :return: None
+        """
+        if entry.size > self._max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += entry.size
+            while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def invalidate(self, uri_prefix=None) -> None:
+        """
+        Drop cached entries.
+
+        :param uri_prefix: drop only entries of URIs, starting with it. None drops everything.
+        :return: None
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if uri_prefix is None or key[1].startswith(uri_prefix):
+                    self._size -= self._entries.pop(key).size
+
+
+class PageIterator:
+    """
+    Lazy iterator over a paginated API collection.
+
+    Pages are requested only as items are consumed. While the current
+    page is consumed, the next one is already being requested in the background.
+
+    Paging is either by the cursor (response has the cursor of the next page
+    in "next", null at the end) or by the offset (page shorter than
+    the page size is the last one).
+    """
+    CURSOR = "cursor"
+    OFFSET = "offset"
+
+    def __init__(self, call, uri, items_key, query=None, page_size=100, paging=CURSOR, transform=None):
+        """
+        :param call: BaseCall, doing the requests
+        :param uri: URI of the collection
+        :param items_key: key of the items list in the response
+        :param query: query parameters
+        :param page_size: number of items per page
+        :param paging: CURSOR or OFFSET
+        :param transform: callable, accepting one item and returning the object to yield
+        """
+        self._call = call
+        self._uri = uri
+        self._items_key = items_key
+        self._query = dict(query or {})
+        self._page_size = page_size
+        self._paging = paging
+        self._transform = transform or (lambda item: item)
+        self._page = collections.deque()
+        self._next = None      # Future of the next page
+        self._position = None  # Cursor or offset of the next page to request. None is the first page.
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    def _get_page(self, position) -> tuple:
+        """
+        Request a page.
+
+        :param position: cursor or offset of the page
+        :return: tuple of items and position of the following page (None at the end)
+        """
+        query = dict(self._query, limit=self._page_size)
+        if position is not None:
+            query[self._paging] = position
+        doc = self._call._request(self._uri, query=query)
+        items = doc[self._items_key]
+
+        if self._paging == self.CURSOR:
+            position = doc.get("next")
+        elif len(items) < self._page_size:
+            position = None
+        else:
+            position = (position or 0) + len(items)
+
+        return items, position
+
+    def _prefetch(self) -> None:
+        """
+        Request the next page in the background.
+
+        :return: None
+        """
+        if self._next is None and not self._exhausted:
+            self._next = self._call.client.prefetch(self._get_page, self._position)
+
+    def next_page(self) -> list:
+        """
+        Get the rest of the current page or the next page.
+
+        :return: list of items, empty at the end of the collection
+        """
+        with self._lock:
+            if not self._page:
+                if self._next is None:
+                    if self._exhausted:
+                        return []
+                    self._prefetch()
+                # Failed page is not kept, so it is requested again on the next call
+                page, self._next = self._next, None
+                items, self._position = page.result()
+                self._exhausted = self._position is None
+                self._page.extend(self._transform(item) for item in items)
+                self._prefetch()
+
+            page = list(self._page)
+            self._page.clear()
+
+        return page
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._page:
+            self._page.extend(self.next_page())
+            if not self._page:
+                raise StopIteration
+        return self._page.popleft()
+
+
+class Histogram:
+    """
+    Fixed-size histogram of durations in milliseconds.
+    """
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)  # Last bucket is over the last bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value) -> None:
+        """
+        Add a value.
+
+        :param value: milliseconds
+        :return: None
+        """
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct) -> float:
+        """
+        Get approximate percentile (upper bound of its bucket).
+
+        :param pct: percentile, 0 to 100
+        :return: milliseconds or None, if histogram is empty
+        """
+        if not self.count:
+            return None
+
+        rank = self.count * pct / 100
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BOUNDS[idx] if idx < len(self.BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        """
+        Get histogram as dict.
+
+        :return: dict
+        """
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip([str(bound) for bound in self.BOUNDS] + ["inf"], self.counts)),
+        }
+
+
+class APIStats:
+    """
+    Per-endpoint statistics of the API requests.
+    """
+    class Endpoint:
+        """
+        Statistics of one endpoint.
+        """
+        def __init__(self):
+            self.requests = 0
+            self.wire_bytes = 0
+            self.body_bytes = 0
+            self.formats = collections.Counter()
+            self.statuses = collections.Counter()
+            self.errors = collections.Counter()
+            self.ttfb = Histogram()
+            self.transfer = Histogram()
+            self.decode = Histogram()
+            self.total = Histogram()
+
+        def to_dict(self) -> dict:
+            """
+            Get statistics as dict.
+
+            :return: dict
+            """
+            return {
+                "requests": self.requests,
+                "wire_bytes": self.wire_bytes,
+                "body_bytes": self.body_bytes,
+                "compression": round(self.wire_bytes / self.body_bytes, 3) if self.body_bytes else None,
+                "formats": dict(self.formats),
+                "statuses": {str(status): count for status, count in self.statuses.items()},
+                "errors": dict(self.errors),
+                "ttfb": self.ttfb.to_dict(),
+                "transfer": self.transfer.to_dict(),
+                "decode": self.decode.to_dict(),
+                "total": self.total.to_dict(),
+            }
+
+    class Measure:
+        """
+        Measurement of one request.
+
+        Phases are marked as they happen: response headers are received,
+        body is transferred, body is decoded. Measurement is recorded
+        on exit from its context, including the error, if any.
+        """
+        def __init__(self, stats, endpoint):
+            self._stats = stats
+            self.endpoint = endpoint
+            self.status = None
+            self.wire_bytes = 0
+            self.body_bytes = 0
+            self.fmt = None
+            self.ttfb = self.transfer = self.decode = None
+            self._started = self._last = time.perf_counter()
+
+        def _lap(self) -> float:
+            """
+            Get milliseconds since the previous phase.
+
+            :return: float
+            """
+            now = time.perf_counter()
+            lap, self._last = (now - self._last) * 1000, now
+            return lap
+
+        def responded(self, status) -> None:
+            """
+            Response headers are received.
+
+            :param status: HTTP status code
+            :return: None
+            """
+            self.status = status
+            self.ttfb = self._lap()
+
+        def transferred(self, wire_bytes, body_bytes, fmt=None) -> None:
+            """
+            Response body is transferred.
+
+            :param wire_bytes: bytes of the body, as transferred (compressed)
+            :param body_bytes: bytes of the decompressed body
+            :param fmt: body format (MIME type)
+            :return: None
+            """
+            self.wire_bytes, self.body_bytes, self.fmt = wire_bytes, body_bytes, fmt
+            self.transfer = self._lap()
+
+        def decoded(self) -> None:
+            """
+            Response body is decoded.
+
+            :return: None
+            """
+            self.decode = self._lap()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            self._stats.record(self, error=None if exc_type is None else exc_type.__name__,
+                               total=(time.perf_counter() - self._started) * 1000)
+            return False
+
+    def __init__(self, dump_path=None):
+        """
+        :param dump_path: path of the JSON lines file, where "dump" appends statistics
+        """
+        self.dump_path = dump_path
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def measure(self, endpoint) -> 'APIStats.Measure':
+        """
+        Start measurement of a request.
+
+        Example:
+
+            with stats.measure("/clients/status") as measure:
+                ...
+                measure.responded(200)
+
+        :param endpoint: endpoint name
+        :return: Measure
+        """
+        return APIStats.Measure(self, endpoint)
+
+    def record(self, measure, error=None, total=None) -> None:
+        """
+        Record finished request.
+
+        :param measure: Measure of the request
+        :param error: name of the error, if request failed
+        :param total: milliseconds of the whole request
+        :return: None
+        """
+        with self._lock:
+            stats = self._endpoints.get(measure.endpoint)
+            if stats is None:
+                stats = self._endpoints[measure.endpoint] = APIStats.Endpoint()
+            stats.requests += 1
+            stats.wire_bytes += measure.wire_bytes
+            stats.body_bytes += measure.body_bytes
+            if measure.fmt:
+                stats.formats[measure.fmt] += 1
+            if measure.status is not None:
+                stats.statuses[measure.status] += 1
+            if error is not None:
+                stats.errors[error] += 1
+            for histogram, value in ((stats.ttfb, measure.ttfb), (stats.transfer, measure.transfer),
+                                     (stats.decode, measure.decode), (stats.total, total)):
+                if value is not None:
+                    histogram.add(value)
+
+    def get_stats(self) -> dict:
+        """
+        Get statistics of all endpoints.
+
+        :return: dict of endpoint name to its statistics
+        """
+        with self._lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in self._endpoints.items()}
+
+    def dump(self, path=None) -> None:
+        """
+        Append statistics of all endpoints to the JSON lines file, one line per endpoint.
+
+        :param path: path to the file. Default is "dump_path".
+        :return: None
+        """
+        path = path or self.dump_path
+        if not path:
+            raise sugarui.exceptions.RequestError("Path of the statistics dump is not configured")
+
+        timestamp = time.time()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as dump:
+            for endpoint, stats in sorted(self.get_stats().items()):
+                dump.write(json.dumps(dict(stats, endpoint=endpoint, timestamp=timestamp)) + "\n")
+
 
 class BaseCall:
     """
     Base network requests call.
     """
     def __init__(self, client):
-        self._api_root_url = "https://localhost:8000"
+        self._api_root_url = client.url
         self.client = client
 
-    def _request(self, uri, query=None, method="GET"):
+    def _send(self, uri, params, headers, method="GET", stream=False, body=None, measure=None) -> requests.Response:
         """
-        Generic API request.
+        Send request to the API and check the response status.
 
-        :param uri:
-        :return: JSON
+        :param uri: URI of the resource
+        :param params: query parameters
+        :param headers: request headers
+        :param method: HTTP method
+        :param stream: do not download the body right away
+        :param body: object, sent as JSON body
+        :param measure: APIStats.Measure of the request
+        :return: response
         """
         verify_ssl = self.client._config.crypto.ssl.verify
-        params = {}
-        params.update(query or {})
-
-        headers = {
+        headers = dict({
             "Content-Type": "application/json; charset=utf-8",
-            "Accept": "application/json"
-        }
+            "Accept": self.client.accept,
+            "Accept-Encoding": "gzip, deflate",
+        }, **headers)
         url = urllib.parse.urljoin(self._api_root_url, uri.lstrip("/"))
-        response = requests.request(method, url, params=params, headers=headers, verify=verify_ssl)
+        # Body is always read after the headers, so time to the first byte is not mixed with the transfer
+        response = self.client.session.request(method, url, params=params, headers=headers, stream=True,
+                                               data=None if body is None else json.dumps(body),
+                                               verify=verify_ssl, timeout=self.client.timeout)
+        if measure is not None:
+            measure.responded(response.status_code)
 
         if response.status_code == http.HTTPStatus.UNAUTHORIZED:
             raise sugarui.exceptions.UnauthorisedError("{} for {}".format(response.text, url))
-        elif response.status_code != http.HTTPStatus.OK:
+        elif response.status_code >= http.HTTPStatus.INTERNAL_SERVER_ERROR:
+            raise sugarui.exceptions.RequestError("{} at {}".format(response.text, url))
+        elif response.status_code not in (http.HTTPStatus.OK, http.HTTPStatus.NOT_MODIFIED):
             raise sugarui.exceptions.UnknownResourceError("{} at {}".format(response.text, url))
 
+        if not stream:
+            body_bytes = len(response.content)
+            if measure is not None:
+                measure.transferred(self._get_wire_bytes(response, body_bytes), body_bytes,
+                                    response.headers.get("Content-Type", "").split(";")[0])
+
+        return response
+
+    @staticmethod
+    def _get_wire_bytes(response, body_bytes) -> int:
+        """
+        Get number of body bytes, as they were transferred (before decompression).
+
+        :param response: read response
+        :param body_bytes: size of the decompressed body
+        :return: int
+        """
         try:
-            obj = response.json()
-        except Exception as ex:
-            raise Exception(ex)
+            return response.raw.tell()
+        except Exception:
+            return body_bytes
+
+    @staticmethod
+    def _decode(response):
+        """
+        Decode response body by its content type.
+
+        :param response: response
+        :return: decoded object
+        """
+        if msgpack is not None and response.headers.get("Content-Type", "").startswith(MIME_MSGPACK):
+            return msgpack.unpackb(response.content, raw=False)
+        return response.json()
+
+    def _request(self, uri, query=None, method="GET", body=None, endpoint=None):
+        """
+        Generic API request.
+        Identical concurrent GET requests are sharing one call.
+
+        :param uri:
+        :param endpoint: name of the endpoint in the statistics. Default is URI.
+        :return: JSON
+        """
+        params = {}
+        params.update(query or {})
+        if method != "GET":
+            return self._fetch(uri, params, method, body=body, endpoint=endpoint)
+
+        key = (method, uri, tuple(sorted(params.items())))
+        return self.client.single_flight.do(key, self._fetch, uri, params, method,
+                                            cache_key=key if self.client.cache.is_cached(uri) else None,
+                                            endpoint=endpoint)
+
+    def _fetch(self, uri, params, method="GET", cache_key=None, body=None, endpoint=None):
+        """
+        Request the API, using cached response where possible.
+
+        :param uri: URI of the resource
+        :param params: query parameters
+        :param method: HTTP method
+        :param cache_key: key of the response in the cache. None does not use the cache.
+        :param body: object, sent as JSON body
+        :param endpoint: name of the endpoint in the statistics
+        :return: JSON
+        """
+        headers = {}
+        entry = None
+        if cache_key is not None:
+            entry = self.client.cache.get(cache_key)
+            if entry is not None:
+                if entry.is_fresh():
+                    return entry.obj
+                headers.update(entry.get_validators())
+
+        with self.client.stats.measure(endpoint or uri) as measure:
+            response = self._send(uri, params, headers, method=method, body=body, measure=measure)
+            if response.status_code == http.HTTPStatus.NOT_MODIFIED and entry is not None:
+                entry.expires = time.monotonic() + self.client.cache.get_ttl(uri)
+                return entry.obj
+
+            try:
+                obj = self._decode(response)
+            except Exception as ex:
+                raise Exception(ex)
+            measure.decoded()
+
+        if cache_key is not None:
+            etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            ttl = self.client.cache.get_ttl(uri)
+            if etag or last_modified or ttl:
+                self.client.cache.put(cache_key, ResponseCache.Entry(obj, len(response.content), etag=etag,
+                                                                     last_modified=last_modified,
+                                                                     expires=time.monotonic() + ttl))
 
         return obj
 
+    def _paginate(self, uri, items_key, query=None, page_size=100, paging=PageIterator.CURSOR,
+                  transform=None) -> PageIterator:
+        """
+        Generic API request of a paginated collection.
+
+        :param uri: URI of the collection
+        :param items_key: key of the items list in the response
+        :param query: query parameters
+        :param page_size: number of items per page
+        :param paging: PageIterator.CURSOR or PageIterator.OFFSET
+        :param transform: callable, accepting one item and returning the object to yield
+        :return: PageIterator
+        """
+        return PageIterator(self, uri, items_key, query=query, page_size=page_size, paging=paging,
+                            transform=transform)
+
+    def _stream(self, uri, key, query=None, chunk_size=0x10000, endpoint=None, others=None):
+        """
+        Generic API request, decoding the mapping under the key
+        of the response object while it is being downloaded.
+
+        :param uri: URI of the resource
+        :param key: key of the mapping in the response object
+        :param query: query parameters
+        :param chunk_size: size of the downloaded chunks
+        :param endpoint: name of the endpoint in the statistics. Default is URI.
+        :param others: dict to put the other members of the response object to
+        :return: generator of (name, value) tuples
+        """
+        body_bytes = 0
+
+        def chunks(response):
+            nonlocal body_bytes
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                body_bytes += len(chunk)
+                yield chunk
+
+        # Incremental decoding is JSON-only. Transfer and decoding are overlapping, so their time is "transfer".
+        with self.client.stats.measure(endpoint or uri + " (stream)") as measure:
+            with self._send(uri, dict(query or {}), {"Accept": MIME_JSON}, stream=True, measure=measure) as response:
+                yield from iter_json_mapping(chunks(response), key, others=others)
+                measure.transferred(self._get_wire_bytes(response, body_bytes), body_bytes, MIME_JSON)
+
 
 class Systems(BaseCall):
     """
     Systems connector.
     """
+    ADDED = "added"
+    CHANGED = "changed"
+    REMOVED = "removed"
+
     class System:
-        def __init__(self, data):
-            self.data = data
+        """
+        Compact system record.
+
+        Only the fields, displayed by the UI, are kept. The complete
+        record is requested from the master by "get_record".
+        """
+        __slots__ = ("id", "host", "online", "os", "_systems", "_data")
+
+        def __init__(self, data, systems=None, complete=False):
+            """
+            :param data: system record, as returned by the master
+            :param systems: Systems connector, loading the complete record
+            :param complete: keep the data as complete record
+            """
+            self.id = data["id"]
+            self.host = data["host"]
+            self.online = bool(data.get("online"))
+            self.os = sys.intern(data["os"]) if data.get("os") else None  # Same few values over the whole fleet
+            self._systems = systems
+            self._data = data if complete else None
+
+        def get_record(self) -> dict:
+            """
+            Get complete system record. It is requested from the master on the first call,
+            so call it from a worker (e.g. "SugarForm.api_call"), never from the UI thread.
+
+            :return: dict
+            """
+            if self._data is None:
+                if self._systems is not None:
+                    self._data = self._systems.get_record(self.id)
+                if self._data is None:
+                    self._data = {"id": self.id, "host": self.host, "online": self.online, "os": self.os}
+            return self._data
+
+        def get_state(self) -> tuple:
+            """
+            Get displayed state of the system, to find out whether it has changed.
+
+            :return: tuple
+            """
+            return self.host, self.online, self.os
 
         def __str__(self):
-            return self.data["host"]
+            return self.host
+
+    def __init__(self, client):
+        BaseCall.__init__(self, client)
+        self._by_id = {}
+        self._by_host = {}
+        self._revision = None
+        self._change_listeners = []
+        self._lock = threading.Lock()
+
+    def _update_index(self, systems, full=False) -> None:
+        """
+        Update inventory index of the systems.
+
+        :param systems: list of systems
+        :param full: systems are the complete inventory, replacing the previous one
+        :return: None
+        """
+        by_id, by_host = ({}, {}) if full else (dict(self._by_id), dict(self._by_host))
+        for system in systems:
+            previous = by_id.get(system.id)
+            if previous is not None and previous.host != system.host:
+                by_host.pop(previous.host, None)
+            by_id[system.id] = system
+            by_host[system.host] = system
+
+        # Swapping is atomic, so lookups from the other threads never see half-built index
+        self._by_id, self._by_host = by_id, by_host
+
+    def add_change_listener(self, callback) -> None:
+        """
+        Add listener of the inventory changes, found by "sync".
+        Callback accepts a list of (event, system) tuples, where event is
+        one of ADDED, CHANGED or REMOVED. Note, it is called from the thread of the "sync".
+
+        :param callback: callable
+        :return: None
+        """
+        self._change_listeners.append(callback)
+
+    def sync(self) -> list:
+        """
+        Synchronise inventory with the master.
+
+        Only changes since the revision of the previous sync are requested.
+        If master answers with the complete inventory instead (no previous revision,
+        revision is too old or master does not support changes), it is compared
+        to the current one.
+
+        :return: list of (event, system) tuples
+        """
+        query = {"since": self._revision} if self._revision is not None else None
+        doc = self._request("/clients/status", query=query)
+
+        return self._merge(doc, revision=doc.get("revision"))
+
+    def _merge(self, doc, revision=None) -> list:
+        """
+        Merge status document into the inventory and notify the change listeners.
+
+        :param doc: status document, either complete or "delta"
+        :param revision: revision of the inventory after the merge
+        :return: list of (event, system) tuples
+        """
+        systems = [Systems.System(data, self) for data in doc["systems"].values()]
+        with self._lock:  # Both "sync" and the event stream are merging
+            events = []
+            by_id = self._by_id
+            for system in systems:
+                previous = by_id.get(system.id)
+                if previous is None:
+                    events.append((self.ADDED, system))
+                elif system.get_state() != previous.get_state():
+                    events.append((self.CHANGED, system))
+
+            full = not doc.get("delta")
+            if full:
+                current = {system.id for system in systems}
+                removed = [system for sid, system in by_id.items() if sid not in current]
+                self._update_index(systems, full=True)
+            else:
+                removed = [by_id[sid] for sid in doc.get("removed", []) if sid in by_id]
+                self._update_index(systems)
+                self._remove_index(removed)
+            events.extend((self.REMOVED, system) for system in removed)
+
+            if full or events or self._revision != revision:
+                changed = systems if full else [system for event, system in events if event != self.REMOVED]
+                self._save_snapshot(changed, removed=[system.id for system in removed], revision=revision, full=full)
+            self._revision = revision
+
+        if events:
+            for callback in self._change_listeners:
+                callback(events)
+
+        return events
+
+    def on_event(self, event, data) -> None:
+        """
+        Merge change of one system, pushed by the master (see EventStream).
+
+        Revision of the inventory is not changed, so the next "sync" requests
+        the same changes once again. This does no harm, as they are already merged,
+        but nothing is missed, if the event stream had a gap.
+
+        :param event: EventStream.SYSTEM or EventStream.RESET
+        :param data: {"system": record} or {"removed": ID}
+        :return: None
+        """
+        if event == EventStream.RESET:
+            self.sync()
+        elif "system" in data:
+            self._merge({"delta": True, "systems": {data["system"]["id"]: data["system"]}}, revision=self._revision)
+        elif "removed" in data:
+            self._merge({"delta": True, "systems": {}, "removed": [data["removed"]]}, revision=self._revision)
+
+    def _save_snapshot(self, systems, removed=(), revision=None, full=False) -> None:
+        """
+        Save systems to the snapshot, if the client has one.
+
+        :param systems: list of systems
+        :param removed: list of IDs of the removed systems
+        :param revision: revision of the inventory
+        :param full: systems are the complete inventory
+        :return: None
+        """
+        if self.client.snapshot is not None:
+            self.client.snapshot.save_systems(systems, removed=removed, revision=revision, full=full)
+
+    def load_snapshot(self) -> list:
+        """
+        Load the inventory, saved by the previous session, into the index.
+        Systems are stale until the next "sync", which reconciles them with the master.
+
+        :return: list of systems, empty if there is no snapshot
+        """
+        if self.client.snapshot is None:
+            return []
+
+        revision, records = self.client.snapshot.load_systems()
+        systems = [Systems.System(record, self) for record in records]
+        self._update_index(systems, full=True)
+        self._revision = revision
+
+        return systems
+
+    def _remove_index(self, systems) -> None:
+        """
+        Remove systems from the inventory index.
+
+        :param systems: list of systems
+        :return: None
+        """
+        if not systems:
+            return
+
+        by_id, by_host = dict(self._by_id), dict(self._by_host)
+        for system in systems:
+            by_id.pop(system.id, None)
+            by_host.pop(system.host, None)
+        self._by_id, self._by_host = by_id, by_host
+
+    def lookup(self, key) -> 'Systems.System':
+        """
+        Find a system in the inventory of the last fetch by its ID or a hostname.
+
+        :param key: system ID or hostname
+        :return: System or None
+        """
+        return self._by_id.get(key) or self._by_host.get(key)
+
+    @staticmethod
+    def _get_system_uri(id) -> str:
+        """
+        Get URI of the single system status.
+
+        :param id: system ID
+        :return: URI
+        """
+        return "/clients/status/{}".format(urllib.parse.quote(id, safe=""))
+
+    def get_record(self, id) -> dict:
+        """
+        Get complete record of the system.
+
+        :param id: system ID
+        :return: dict or None, if master has no such record
+        """
+        try:
+            return self._request(self._get_system_uri(id), endpoint="/clients/status/<id>")["systems"].get(id)
+        except sugarui.exceptions.UnknownResourceError:
+            return None
 
     def get_status(self, id=None) -> list:
         """
         Get client status.
 
-        :param id:
+        :param id: get status of only one system with this ID
+        :return: list of systems
+        """
+        uri = "/clients/status" if id is None else self._get_system_uri(id)
+
+        try:
+            doc = self._request(uri, endpoint=None if id is None else "/clients/status/<id>")
+        except sugarui.exceptions.UnknownResourceError:
+            if id is None:
+                raise
+            # Master has no single-system endpoint (or the system): answer from the last full fetch
+            return [self._by_id[id]] if id in self._by_id else []
+
+        return self._load_status(doc, full=id is None)
+
+    def _load_status(self, doc, full=True) -> list:
+        """
+        Load systems from the status document into the inventory.
+
+        :param doc: status document
+        :param full: document has all the systems, otherwise complete records of some systems
         :return: list of systems
         """
-        out = []
-        for system in self._request("/clients/status")["systems"].values():
-            if (id is not None and system["id"] == id) or id is None:
-                out.append(Systems.System(system))
+        out = [Systems.System(system, self, complete=not full) for system in doc["systems"].values()]
+        with self._lock:
+            self._update_index(out, full=full)
+            if full:
+                self._revision = doc.get("revision")
+        if full:
+            self._save_snapshot(out, revision=doc.get("revision"), full=True)
 
         return out
 
+    def add_status_request(self, batch: 'Batch') -> concurrent.futures.Future:
+        """
+        Add request of all clients status to the batch.
+
+        :param batch: Batch
+        :return: Future of the list of systems
+        """
+        return batch.add("/clients/status", transform=self._load_status)
+
+    def iter_status(self):
+        """
+        Get status of all clients, while it is being downloaded.
+
+        :return: generator of systems
+        """
+        out, doc = [], {}
+        for _, data in self._stream("/clients/status", "systems", others=doc):
+            system = Systems.System(data, self)
+            out.append(system)
+            yield system
+        with self._lock:
+            self._update_index(out, full=True)
+            # Revision of the complete inventory, so the next "sync" requests only the changes
+            self._revision = doc.get("revision")
+        self._save_snapshot(out, revision=doc.get("revision"), full=True)
+
+
+class Jobs(BaseCall):
+    """
+    Jobs connector.
+    """
+    RECENT = 1000  # Number of the recent jobs, kept in the snapshot
+
+    def get_recent(self, limit=RECENT) -> list:
+        """
+        Get the most recent jobs and save them to the snapshot.
+
+        :param limit: number of jobs
+        :return: list of job records, newest first
+        """
+        jobs = list(itertools.islice(self.iter_history(page_size=min(limit, 100)), limit))
+        self.save_snapshot(jobs)
+
+        return jobs
+
+    def save_snapshot(self, jobs) -> None:
+        """
+        Save the most recent jobs to the snapshot, at most RECENT of them.
+
+        :param jobs: list of job records, newest first
+        :return: None
+        """
+        if self.client.snapshot is not None:
+            self.client.snapshot.save_jobs(jobs[:self.RECENT])
+
+    def load_snapshot(self) -> list:
+        """
+        Load the most recent jobs, saved by the previous session.
+
+        :return: list of job records, newest first. Empty if there is no snapshot.
+        """
+        return [] if self.client.snapshot is None else self.client.snapshot.load_jobs()
+
+    def iter_history(self, page_size=100) -> PageIterator:
+        """
+        Get jobs history, newest first. Pages are requested as they are consumed.
+
+        :param page_size: number of jobs per page
+        :return: PageIterator of job records
+        """
+        return self._paginate("/jobs/history", "jobs", page_size=page_size)
+
+
+class EventStream(BaseCall):
+    """
+    Subscription to the events, pushed by the master as Server-Sent Events.
+
+    The stream is read in its own thread, reconnecting after errors.
+    On reconnection, the master resumes the stream after the last received event.
+    If it can not, it sends RESET event, so the subscribers should request the whole state again.
+    """
+    URI = "/events"
+    RESET = "reset"
+    SYSTEM = "system"
+    JOB = "job"
+    RETRY = 3  # Seconds to reconnect, unless master advises otherwise
+    MAX_RETRY = 60  # Seconds to reconnect after repeated errors
+
+    def __init__(self, client):
+        BaseCall.__init__(self, client)
+        self.last_event_id = None
+        self.connected = False
+        self._retry = self.RETRY
+        self._listeners = collections.defaultdict(list)
+        self._stopped = threading.Event()
+        self._response = None
+        self._thread = None
+
+    def add_listener(self, event, callback) -> None:
+        """
+        Add listener of the events.
+        Note, it is called from the thread of the stream.
+
+        :param event: type of the event, e.g. SYSTEM or JOB
+        :param callback: callable, accepting type of the event and its data
+        :return: None
+        """
+        self._listeners[event].append(callback)
+
+    def start(self) -> None:
+        """
+        Start receiving events in the background.
+
+        :return: None
+        """
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="sugar-events", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop receiving events.
+
+        :return: None
+        """
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            # Closing waits for the blocked read until the next event. Shut down socket unblocks it right away.
+            sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            else:
+                response.close()
+        self._thread = None
+
+    def _run(self) -> None:
+        """
+        Read the stream, until stopped.
+
+        :return: None
+        """
+        failures = 0
+        while not self._stopped.is_set():
+            try:
+                if self._read():
+                    failures = 0
+            except Exception:
+                pass  # The same, as a disconnection
+            finally:
+                self.connected = False
+                self._response = None
+            failures += 1
+            self._stopped.wait(min(self._retry * 2 ** (failures - 1), max(self.MAX_RETRY, self._retry)))
+
+    def _read(self) -> bool:
+        """
+        Connect and dispatch the events until the stream ends.
+
+        :return: True, if any event was received
+        """
+        headers = {"Accept": "text/event-stream", "Accept-Encoding": "identity"}
+        if self.last_event_id is not None:
+            headers["Last-Event-ID"] = self.last_event_id
+
+        received = False
+        with self._send(self.URI, {}, headers, stream=True) as response:
+            self._response = response
+            self.connected = True
+            # Everything received is parsed right away, not waiting for a buffer to fill up
+            read = getattr(response.raw, "read1", None)
+            chunks = iter(lambda: read(0x10000), b"") if read is not None else response.iter_content(chunk_size=None)
+            for event_id, event, data, retry in iter_server_events(chunks):
+                if retry is not None:
+                    self._retry = retry
+                if event_id is not None:
+                    self.last_event_id = event_id
+                if data is not None:
+                    received = True
+                    self._dispatch(event, json.loads(data))
+                if self._stopped.is_set():
+                    break
+
+        return received
+
+    def _dispatch(self, event, data) -> None:
+        """
+        Call listeners of the event. Errors of the listeners are not stopping the stream.
+
+        :param event: type of the event
+        :param data: decoded data of the event
+        :return: None
+        """
+        for callback in self._listeners.get(event, []):
+            try:
+                callback(event, data)
+            except Exception:
+                pass
+
+
+class Batch(BaseCall):
+    """
+    Several API requests in one round trip.
+
+    Example:
+
+        batch = api.batch()
+        status = api.systems.add_status_request(batch)
+        modules = batch.add("/modules")
+        batch.execute()
+        status.result(), modules.result()
+
+    If master does not support batches, requests are sent concurrently instead.
+    """
+    URI = "/batch"
+
+    def __init__(self, client):
+        BaseCall.__init__(self, client)
+        self._requests = []
+
+    def add(self, uri, query=None, transform=None) -> concurrent.futures.Future:
+        """
+        Add GET request to the batch.
+
+        :param uri: URI of the resource
+        :param query: query parameters
+        :param transform: callable, accepting decoded response and returning the result
+        :return: Future of the result
+        """
+        future = concurrent.futures.Future()
+        self._requests.append((uri, dict(query or {}), transform or (lambda obj: obj), future))
+        return future
+
+    def execute(self) -> list:
+        """
+        Send all the requests and wait for their results.
+
+        :return: list of futures, in the order of adding requests
+        """
+        pending, self._requests = self._requests, []
+        if not pending:
+            return []
+
+        if self.client.batch_supported is not False:
+            try:
+                self._execute_batch(pending)
+            except sugarui.exceptions.UnknownResourceError:
+                self.client.batch_supported = False
+
+        if self.client.batch_supported is False:
+            self._execute_concurrently(pending)
+
+        return [future for _, _, _, future in pending]
+
+    def _execute_batch(self, pending) -> None:
+        """
+        Send all the requests in one batch request.
+
+        :param pending: list of requests
+        :return: None
+        """
+        try:
+            doc = self._request(self.URI, method="POST",
+                                body={"requests": [{"uri": uri, "query": query} for uri, query, _, _ in pending]})
+        except sugarui.exceptions.UnknownResourceError:
+            raise
+        except Exception as ex:
+            for _, _, _, future in pending:
+                future.set_exception(ex)
+            return
+
+        responses = doc.get("responses") if isinstance(doc, dict) else None
+        if not isinstance(responses, list):
+            # Every future must be resolved, otherwise the callers are waiting for them forever
+            for _, _, _, future in pending:
+                future.set_exception(sugarui.exceptions.RequestError("Malformed reply of the batch request"))
+            return
+
+        self.client.batch_supported = True
+        for idx, (uri, _, transform, future) in enumerate(pending):
+            response = responses[idx] if idx < len(responses) else None
+            if not isinstance(response, dict):
+                future.set_exception(sugarui.exceptions.RequestError("No response to {} in the batch".format(uri)))
+                continue
+            status = response.get("status", http.HTTPStatus.OK)
+            if status == http.HTTPStatus.UNAUTHORIZED:
+                future.set_exception(sugarui.exceptions.UnauthorisedError("Unauthorised for {}".format(uri)))
+            elif status != http.HTTPStatus.OK:
+                future.set_exception(sugarui.exceptions.UnknownResourceError(
+                    "{} at {}".format(response.get("body"), uri)))
+            else:
+                self._resolve(future, transform, response.get("body"))
+
+    def _execute_concurrently(self, pending) -> None:
+        """
+        Send all the requests at once, each in its own thread.
+
+        :param pending: list of requests
+        :return: None
+        """
+        # Own threads: the batch itself might run on a worker of the client
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            for uri, query, transform, future in pending:
+                executor.submit(self._fetch_one, uri, query, transform, future)
+
+    def _fetch_one(self, uri, query, transform, future) -> None:
+        """
+        Send one request of the batch.
+
+        :param uri: URI of the resource
+        :param query: query parameters
+        :param transform: result transformer
+        :param future: Future of the result
+        :return: None
+        """
+        try:
+            obj = self._request(uri, query=query)
+        except Exception as ex:
+            future.set_exception(ex)
+        else:
+            self._resolve(future, transform, obj)
+
+    @staticmethod
+    def _resolve(future, transform, obj) -> None:
+        """
+        Set transformed result to the future.
+
+        :param future: Future of the result
+        :param transform: result transformer
+        :param obj: decoded response
+        :return: None
+        """
+        try:
+            future.set_result(transform(obj))
+        except Exception as ex:
+            future.set_exception(ex)
+
 
 @Singleton
 class SugarAPIClient:
     """
     Sugar API composite client.
     """
-    def __init__(self, config):
+    URL = "https://localhost:8000"
+    POOL_SIZE = 10
+    TIMEOUT = (3.05, 30)  # Connect, read
+    WORKERS = 4
+    UNCACHED = ("/clients/status",)  # Inventory is kept as compact records, the decoded one is much bigger
+
+    @staticmethod
+    def _get_snapshot(path):
+        """
+        Open the snapshot. The snapshot is only a cache, so if it can't be opened
+        (e.g. the directory is not writable), the client works without it.
+
+        :param path: path of the snapshot file
+        :return: Snapshot or None
+        """
+        try:
+            return Snapshot(path)
+        except (OSError, sqlite3.Error):
+            return None
+
+    def __init__(self, config, url=URL, pool_size=POOL_SIZE, timeout=TIMEOUT, workers=WORKERS, cache_ttl=None,
+                 stats_file=None, snapshot_file=None):
+        """
+        :param config: Sugar configuration
+        :param url: root URL of the Sugar master API
+        :param pool_size: maximum of kept-alive connections per host
+        :param timeout: default timeout for each request (connect, read)
+        :param workers: number of background threads for the API calls
+        :param cache_ttl: mapping of URI prefix to seconds, while the response is not requested again
+        :param stats_file: path of the JSON lines file to dump API statistics, also on "close"
+        :param snapshot_file: path of the file to keep the last known inventory and job history
+        """
         self._config = config
+        self.url = url
+        self.timeout = timeout
+        self.session = self._get_session(pool_size)
+        self.cache = ResponseCache(ttl=cache_ttl, uncached=self.UNCACHED)
+        self.single_flight = SingleFlight()
+        self.batch_supported = None  # Unknown, until the first batch
+        self.stats = APIStats(dump_path=stats_file)
+        self.snapshot = self._get_snapshot(snapshot_file) if snapshot_file else None
+        self.accept = MIME_JSON if msgpack is None else "{}, {};q=0.9".format(MIME_MSGPACK, MIME_JSON)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sugar-api")
+        # Prefetching never waits for other calls, so it can't be starved by the calls, waiting for it
+        self._prefetcher = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="sugar-prefetch")
         self.systems = Systems(self)
+        self.jobs = Jobs(self)
+        self.events = EventStream(self)
+        self.events.add_listener(EventStream.SYSTEM, self.systems.on_event)
+        self.events.add_listener(EventStream.RESET, self.systems.on_event)
+
+    @staticmethod
+    def _get_session(pool_size) -> requests.Session:
+        """
+        Create HTTP session, shared by all the calls.
+        Connections to the master are kept alive in the pool,
+        so TCP connection and TLS handshake are not happening on each call.
+
+        :param pool_size: maximum of connections per host
+        :return: requests.Session
+        """
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+        session = requests.Session()
+        session.headers["Connection"] = "keep-alive"
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def submit(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Run an API call in the background.
+
+        Example:
+
+            future = api.submit(api.systems.get_status)
+
+        :param func: callable, usually a method of a call, e.g. "api.systems.get_status"
+        :param args: arguments to the callable
+        :param kwargs: keywords to the callable
+        :return: Future of the call result
+        """
+        return self._executor.submit(func, *args, **kwargs)
+
+    def prefetch(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Request data ahead of its use in the background.
+
+        :param func: callable
+        :param args: arguments to the callable
+        :param kwargs: keywords to the callable
+        :return: Future of the call result
+        """
+        return self._prefetcher.submit(func, *args, **kwargs)
+
+    def batch(self) -> Batch:
+        """
+        Create a batch of requests, sent in one round trip.
+
+        :return: Batch
+        """
+        return Batch(self)
+
+    def get_stats(self) -> dict:
+        """
+        Get statistics of the API calls.
+
+        :return: dict
+        """
+        return {
+            "endpoints": self.stats.get_stats(),
+            "single_flight": self.single_flight.get_stats(),
+        }
+
+    def close(self):
+        """
+        Stop background workers and close all pooled connections.
+        Statistics are dumped, if the dump file is configured.
+
+        :return:
+        """
+        if self.stats.dump_path:
+            self.stats.dump()
+        self.events.stop()
+        self._executor.shutdown(wait=False)
+        self._prefetcher.shutdown(wait=False)
+        self.session.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
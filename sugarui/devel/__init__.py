@@ -0,0 +1,5 @@
+# coding: utf-8
+"""
+Development tools: local stand-in of the Sugar master and the API load test.
+These are not used by the UI itself.
+"""
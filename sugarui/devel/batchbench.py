@@ -0,0 +1,124 @@
+# coding: utf-8
+"""
+Benchmark of the batched fetch.
+
+Fetches the same number of system records from the local fake master
+one after another ("sequential") and in one batch, with the fixed simulated
+round-trip time of the master, and reports the median milliseconds per fetch:
+
+    python -m sugarui.devel.batchbench --rtt 0 0.005 0.02 0.05 --requests 1 5 20 50
+"""
+import sys
+import json
+import time
+import random
+import argparse
+
+from sugarui.apiconnector import SugarAPIClient, Systems
+from sugarui.devel.fakemaster import FakeMaster
+
+
+def fetch_sequential(api, ids) -> None:
+    """
+    Fetch the records one after another.
+
+    :param api: SugarAPIClient
+    :param ids: system IDs
+    :return: None
+    """
+    for sid in ids:
+        api.systems.get_record(sid)
+
+
+def fetch_batch(api, ids) -> None:
+    """
+    Fetch the records in one batch.
+
+    :param api: SugarAPIClient
+    :param ids: system IDs
+    :return: None
+    """
+    batch = api.batch()
+    for sid in ids:
+        batch.add(Systems._get_system_uri(sid))
+    for future in batch.execute():
+        future.result()
+
+
+def get_median(api, fetch, samples) -> float:
+    """
+    Get median time of the fetch.
+
+    :param api: SugarAPIClient
+    :param fetch: fetch function
+    :param samples: list of the system IDs of each fetch
+    :return: milliseconds
+    """
+    timings = []
+    for ids in samples:
+        api.cache.invalidate()  # Every fetch is a full round trip, not a revalidation
+        started = time.perf_counter()
+        fetch(api, ids)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    return round(timings[len(timings) // 2] * 1000, 3)
+
+
+def run(rtts, sizes, systems=1000, repeat=20, seed=None) -> dict:
+    """
+    Run the benchmark.
+
+    :param rtts: round-trip times of the master in seconds
+    :param sizes: numbers of the records per fetch
+    :param systems: number of the systems of the master
+    :param repeat: number of the fetches of each kind
+    :param seed: random seed of the fleet and of the fetched records
+    :return: report
+    """
+    from sugar.config import get_config
+
+    rnd = random.Random(seed)
+    report = {"systems": systems, "repeat": repeat, "results": []}
+    with FakeMaster(systems=systems, history=0, seed=seed).start() as master:
+        api = SugarAPIClient(get_config(), url=master.url)
+        try:
+            ids = list(master.fleet.systems)
+            for rtt in rtts:
+                master.latency = rtt
+                for size in sizes:
+                    samples = [rnd.sample(ids, min(size, len(ids))) for _ in range(repeat)]
+                    sequential = get_median(api, fetch_sequential, samples)
+                    batch = get_median(api, fetch_batch, samples)
+                    report["results"].append({"rtt": round(rtt * 1000, 3), "requests": size, "sequential": sequential,
+                                              "batch": batch, "speedup": round(sequential / batch, 1)})
+            report["batch_supported"] = api.batch_supported
+        finally:
+            api.close()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the batched fetch")
+    parser.add_argument("--rtt", type=float, nargs="+", default=[0, 0.005, 0.02, 0.05],
+                        help="round-trip times of the master in seconds")
+    parser.add_argument("--requests", type=int, nargs="+", default=[1, 5, 20, 50],
+                        help="numbers of the records per fetch")
+    parser.add_argument("--systems", type=int, default=1000, help="number of the systems of the master")
+    parser.add_argument("--repeat", type=int, default=20, help="number of the fetches of each kind")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--json", action="store_true", help="print report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.rtt, args.requests, systems=args.systems, repeat=args.repeat, seed=args.seed)
+    if args.json:
+        sys.stdout.write(json.dumps(report) + "\n")
+    else:
+        sys.stdout.write("RTT (ms)  Requests  Sequential (ms)  Batch (ms)  Speedup\n")
+        for result in report["results"]:
+            sys.stdout.write("{rtt:>8}  {requests:>8}  {sequential:>15}  {batch:>10}  {speedup:>6}x\n".format(**result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+# coding: utf-8
+"""
+Local stand-in of the Sugar master.
+
+Serves the API of the master over a synthetic fleet of configurable size,
+with configurable latency, jitter and error rate. Changes of the fleet and
+progress of the jobs are sent as Server-Sent Events at /events. Run it as:
+
+    python -m sugarui.devel.fakemaster --systems 10000 --latency 0.05 --jitter 0.02 --port 8000
+
+and point the client to it, e.g. SugarAPIClient(config, url="http://127.0.0.1:8000").
+"""
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import collections
+import socketserver
+import http.server
+import urllib.parse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Fleet:
+    """
+    Synthetic fleet of systems and their job history, changing over time.
+    """
+    OS = ("Ubuntu 18.04", "openSUSE Leap 15.0", "SLES 12 SP4", "CentOS 7", "Debian 9")
+    JOB_STATES = ("finished", "finished", "finished", "failed", "running")
+    MODULES = ("system.test", "pkg.install", "file.managed", "service.running", "cmd.run")
+    EVENTS = 10000  # Number of the recent events, kept to resume event streams
+
+    def __init__(self, size, history=1000, seed=None):
+        """
+        :param size: number of systems
+        :param history: number of jobs in the history
+        :param seed: seed of the random data
+        """
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._serial = 0
+        self.revision = 1
+        self.systems = {}
+        self._changes = {}  # System ID to (revision, record), record is None if the system is removed
+        self._events = collections.deque(maxlen=self.EVENTS)  # (revision, event, data) to resume event streams
+        self._job = None
+        for _ in range(size):
+            self._add_system()
+        self.jobs = [self._make_job(idx) for idx in range(history)]
+
+    def _add_system(self) -> dict:
+        """
+        Add new system to the fleet.
+
+        :return: record of the system
+        """
+        self._serial += 1
+        sid = hashlib.md5(str(self._serial).encode()).hexdigest()
+        system = self.systems[sid] = {
+            "id": sid,
+            "host": "client-{:06d}.example.lan".format(self._serial),
+            "online": self._random.random() > 0.1,
+            "os": self._random.choice(self.OS),
+        }
+
+        return system
+
+    def _make_job(self, idx) -> dict:
+        """
+        Make job of the history.
+
+        :param idx: serial number of the job
+        :return: job
+        """
+        return {
+            "jid": "{:020d}".format(20190325000000000000 + idx),
+            "module": self._random.choice(self.MODULES),
+            "state": self._random.choice(self.JOB_STATES),
+            "targets": self._random.randint(1, max(1, len(self.systems))),
+        }
+
+    def churn(self, count) -> None:
+        """
+        Change random systems: mostly they go online or offline,
+        sometimes a system is removed or a new one is added.
+
+        :param count: number of changes
+        :return: None
+        """
+        with self._lock:
+            for _ in range(count):
+                self.revision += 1
+                dice = self._random.random()
+                if dice < 0.05 or not self.systems:
+                    system = self._add_system()
+                    self._changes[system["id"]] = (self.revision, system)
+                    self._events.append((self.revision, "system", {"system": dict(system)}))
+                elif dice < 0.1:
+                    sid = self._random.choice(list(self.systems))
+                    del self.systems[sid]
+                    self._changes[sid] = (self.revision, None)
+                    self._events.append((self.revision, "system", {"removed": sid}))
+                else:
+                    system = self.systems[self._random.choice(list(self.systems))]
+                    system["online"] = not system["online"]
+                    self._changes[system["id"]] = (self.revision, system)
+                    self._events.append((self.revision, "system", {"system": dict(system)}))
+            self._changed.notify_all()
+
+    def progress(self, step=1) -> None:
+        """
+        Advance progress of the running job. New job is started after the previous is finished.
+
+        :param step: percents of the progress
+        :return: None
+        """
+        with self._lock:
+            if self._job is None or self._job["progress"] >= 100:
+                self._job = dict(self._make_job(len(self.jobs)), state="running", progress=0)
+                self.jobs.insert(0, self._job)
+            self._job["progress"] = min(100, self._job["progress"] + step)
+            if self._job["progress"] == 100:
+                self._job["state"] = "finished"
+            self.revision += 1
+            self._events.append((self.revision, "job", dict(self._job)))
+            self._changed.notify_all()
+
+    def get_events(self, since, timeout=None) -> list:
+        """
+        Get events after the revision, waiting for them if there are none yet.
+
+        :param since: revision of the last event, known to the client
+        :param timeout: seconds to wait for the events
+        :return: list of (revision, event, data) tuples. None, if the events since
+                 the revision are not kept anymore and the client has to start over.
+        """
+        with self._lock:
+            if self._events and since < self._events[0][0] - 1:
+                return None
+            if since >= self.revision:
+                self._changed.wait(timeout)
+
+            return [event for event in self._events if event[0] > since]
+
+    def get_status(self, since=None) -> dict:
+        """
+        Get status document of all systems, or only their changes since the revision.
+
+        :param since: revision, known to the client
+        :return: status document
+        """
+        with self._lock:
+            if since is None or since > self.revision:
+                return {"revision": self.revision, "systems": dict(self.systems)}
+            return {
+                "revision": self.revision,
+                "delta": True,
+                "systems": {sid: system for sid, (revision, system) in self._changes.items()
+                            if revision > since and system is not None},
+                "removed": [sid for sid, (revision, system) in self._changes.items()
+                            if revision > since and system is None],
+            }
+
+    def get_record(self, sid) -> dict:
+        """
+        Get complete record of the system.
+
+        :param sid: system ID
+        :return: status document with one complete record, None if there is no such system
+        """
+        with self._lock:
+            system = self.systems.get(sid)
+        if system is None:
+            return None
+
+        rnd = random.Random(sid)  # Same details of the same system each time
+        record = dict(system, uptime=rnd.randint(60, 0x1000000), memory=rnd.choice((2, 4, 8, 16, 32)) * 0x400,
+                      ip="10.{}.{}.{}".format(rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(1, 254)),
+                      packages=rnd.randint(300, 3000))
+        return {"systems": {sid: record}}
+
+    def get_history(self, limit, cursor=None, offset=None) -> dict:
+        """
+        Get page of the job history.
+
+        :param limit: page size
+        :param cursor: cursor of the page
+        :param offset: offset of the page, instead of the cursor
+        :return: page document
+        """
+        start = int(offset if offset is not None else cursor or 0)
+        doc = {"jobs": self.jobs[start:start + limit]}
+        if offset is None:
+            doc["next"] = start + limit if start + limit < len(self.jobs) else None
+
+        return doc
+
+
+class FakeMasterHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler of the fake master.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the real master
+    # Headers and body are written separately, so with Nagle's algorithm each kept-alive
+    # request after the first one would wait for the delayed ACK of the client (about 40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.master.verbose:
+            http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def route(self, path, query) -> tuple:
+        """
+        Get response to the API request.
+
+        :param path: URI path
+        :param query: query parameters
+        :return: tuple of HTTP status and the response object
+        """
+        fleet = self.server.master.fleet
+        if path == "/clients/status":
+            return 200, fleet.get_status(int(query["since"]) if "since" in query else None)
+        elif path.startswith("/clients/status/"):
+            doc = fleet.get_record(urllib.parse.unquote(path[len("/clients/status/"):]))
+            return (200, doc) if doc is not None else (404, "No such system")
+        elif path == "/jobs/history":
+            return 200, fleet.get_history(int(query.get("limit", 100)), cursor=query.get("cursor"),
+                                          offset=query.get("offset"))
+
+        return 404, "Unknown resource {}".format(path)
+
+    def _parse(self) -> tuple:
+        """
+        Parse the request path.
+
+        :return: tuple of the path and the query parameters
+        """
+        url = urllib.parse.urlsplit(self.path)
+        return url.path.rstrip("/") or "/", dict(urllib.parse.parse_qsl(url.query))
+
+    def _delay(self) -> bool:
+        """
+        Simulate the latency and the errors of the master.
+
+        :return: True, if the request should fail
+        """
+        master = self.server.master
+        delay = master.latency + random.uniform(-master.jitter, master.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        return random.random() < master.error_rate
+
+    def _reply(self, status, obj, etag=False) -> None:
+        """
+        Send the response, encoded as the client accepts.
+
+        :param status: HTTP status
+        :param obj: response object
+        :param etag: send ETag and reply "Not Modified", if client has the same version
+        :return: None
+        """
+        accept = self.headers.get("Accept", "")
+        if msgpack is not None and "application/msgpack" in accept:
+            body, content_type = msgpack.packb(obj, use_bin_type=True), "application/msgpack"
+        else:
+            body, content_type = json.dumps(obj).encode("utf-8"), "application/json"
+
+        headers = {"Content-Type": content_type}
+        if etag and status == 200:
+            headers["ETag"] = '"{}"'.format(hashlib.md5(body).hexdigest())
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status, body = 304, b""
+
+        if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self) -> None:
+        """
+        Send Server-Sent Events of the fleet changes, until the client disconnects or the master stops.
+        Stream is resumed after the "Last-Event-ID", otherwise it starts with the current changes.
+
+        :return: None
+        """
+        master = self.server.master
+        since = self.headers.get("Last-Event-ID")
+        since = int(since) if since and since.isdigit() else master.fleet.revision
+
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._write_chunk("retry: {:d}\n\n".format(int(master.RETRY * 1000)))
+            while not master.stopped:
+                events = master.fleet.get_events(since, timeout=master.HEARTBEAT)
+                if events is None:
+                    since = master.fleet.revision
+                    events = [(since, "reset", {})]
+                out = []
+                for since, event, data in events:
+                    out.append("id: {}\nevent: {}\ndata: {}\n\n".format(since, event, json.dumps(data)))
+                self._write_chunk("".join(out) or ": heartbeat\n\n")
+            self._write_chunk("")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _write_chunk(self, text) -> None:
+        """
+        Send a chunk of the chunked response. Empty text ends the response.
+
+        :param text: text of the chunk
+        :return: None
+        """
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        path, query = self._parse()
+        if path == "/events":
+            return self._stream_events()
+        if self._delay():
+            return self._reply(500, "Injected error")
+
+        status, obj = self.route(path, query)
+        self._reply(status, obj, etag="since" not in query)
+
+    def do_POST(self):
+        path, _ = self._parse()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8") or "null")
+        if self._delay():
+            return self._reply(500, "Injected error")
+
+        if path != "/batch":
+            return self._reply(404, "Unknown resource {}".format(path))
+
+        responses = []
+        for request in body["requests"]:
+            status, obj = self.route(request["uri"], {k: str(v) for k, v in (request.get("query") or {}).items()})
+            responses.append({"status": status, "body": obj})
+        self._reply(200, {"responses": responses})
+
+
+class FakeMasterServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    Threaded HTTP server of the fake master.
+    """
+    daemon_threads = True
+
+    def __init__(self, master, address):
+        self.master = master
+        http.server.HTTPServer.__init__(self, address, FakeMasterHandler)
+
+
+class FakeMaster:
+    """
+    Local stand-in of the Sugar master.
+
+    Example:
+
+        with FakeMaster(systems=10000, latency=0.02).start() as master:
+            api = SugarAPIClient(config, url=master.url)
+    """
+    RETRY = 1  # Seconds to reconnect the event stream, advised to the clients
+    HEARTBEAT = 10  # Seconds between keep-alive comments on the idle event stream
+    TICK = 0.1  # Seconds between changes of the fleet
+
+    def __init__(self, systems=1000, history=1000, latency=0.0, jitter=0.0, error_rate=0.0, churn=0,
+                 jobs=False, host="127.0.0.1", port=0, seed=None, verbose=False):
+        """
+        :param systems: number of systems in the fleet
+        :param history: number of jobs in the history
+        :param latency: seconds of delay of each response
+        :param jitter: maximum seconds of random deviation from the latency
+        :param error_rate: probability of the response with an error, from 0 to 1
+        :param churn: number of system changes per second
+        :param jobs: run jobs one after another, sending their progress events
+        :param host: address to listen
+        :param port: port to listen, 0 picks any free port
+        :param seed: seed of the random fleet
+        :param verbose: log requests to stderr
+        """
+        self.fleet = Fleet(systems, history=history, seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.churn = churn
+        self.jobs = jobs
+        self.verbose = verbose
+        self._server = FakeMasterServer(self, (host, port))
+        self._stopped = threading.Event()
+        self._threads = []
+
+    @property
+    def url(self) -> str:
+        """
+        Root URL of the master API.
+
+        :return: URL
+        """
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def stopped(self) -> bool:
+        """
+        Master is stopped.
+
+        :return: bool
+        """
+        return self._stopped.is_set()
+
+    def _tick(self) -> None:
+        """
+        Change the fleet and advance the running job on each tick.
+
+        :return: None
+        """
+        changes = 0.0
+        while not self._stopped.wait(self.TICK):
+            changes += self.churn * self.TICK
+            if changes >= 1:
+                self.fleet.churn(int(changes))
+                changes -= int(changes)
+            if self.jobs:
+                self.fleet.progress()
+
+    def start(self) -> 'FakeMaster':
+        """
+        Start serving in the background threads.
+
+        :return: self
+        """
+        self._threads = [threading.Thread(target=self._server.serve_forever, daemon=True)]
+        if self.churn or self.jobs:
+            self._threads.append(threading.Thread(target=self._tick, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop serving.
+
+        :return: None
+        """
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+
+def get_arg_parser(parser=None) -> argparse.ArgumentParser:
+    """
+    Get parser of the fake master options.
+
+    :param parser: parser to add the options to, new one by default
+    :return: argparse.ArgumentParser
+    """
+    parser = parser or argparse.ArgumentParser(description="Local stand-in of the Sugar master")
+    group = parser.add_argument_group("fake master")
+    group.add_argument("--systems", type=int, default=1000, help="number of systems in the fleet")
+    group.add_argument("--history", type=int, default=1000, help="number of jobs in the history")
+    group.add_argument("--latency", type=float, default=0.0, help="seconds of delay of each response")
+    group.add_argument("--jitter", type=float, default=0.0, help="maximum seconds of random deviation")
+    group.add_argument("--error-rate", type=float, default=0.0, help="probability of an error, from 0 to 1")
+    group.add_argument("--churn", type=int, default=0, help="number of system changes per second")
+    group.add_argument("--jobs", action="store_true", help="run jobs, sending their progress events")
+    group.add_argument("--seed", type=int, default=None, help="seed of the random fleet")
+
+    return parser
+
+
+def get_master(args, host="127.0.0.1", port=0, verbose=False) -> FakeMaster:
+    """
+    Create fake master from the parsed options.
+
+    :param args: parsed options
+    :param host: address to listen
+    :param port: port to listen
+    :param verbose: log requests
+    :return: FakeMaster
+    """
+    return FakeMaster(systems=args.systems, history=args.history, latency=args.latency, jitter=args.jitter,
+                      error_rate=args.error_rate, churn=args.churn, jobs=args.jobs, seed=args.seed,
+                      host=host, port=port, verbose=verbose)
+
+
+def main():
+    parser = get_arg_parser()
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests")
+    args = parser.parse_args()
+
+    master = get_master(args, host=args.host, port=args.port, verbose=args.verbose).start()
+    print("Fake Sugar master at {} with {} systems".format(master.url, len(master.fleet.systems)))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        master.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# coding: utf-8
+"""
+Benchmark of the incremental table filter.
+
+Types the query one key at a time, then deletes it, on the rows like the
+System Overview ones, and reports milliseconds per key of the indexed filter
+and of the scan of all the rows. Then changes random rows one at a time,
+as the live updates do, and reports milliseconds per changed row of the index
+update and of making the index again:
+
+    python -m sugarui.devel.filterbench --rows 100000 --query host-0042
+"""
+import sys
+import json
+import time
+import random
+import argparse
+
+from sugarui.widgets.tablefilter import FilterIndex
+
+
+def get_texts(rows, seed=None) -> list:
+    """
+    Generate row texts.
+
+    :param rows: number of the rows
+    :param seed: random seed
+    :return: list of str
+    """
+    rnd = random.Random(seed)
+    return ["host-{:05d}.{}.example.com┃{}".format(idx, rnd.choice(("dc1", "dc2", "lab", "prod")),
+                                                        rnd.choice(("online", "offline")))
+            for idx in range(rows)]
+
+
+def get_keys(query) -> list:
+    """
+    Get queries after each key: typing the query, then deleting it.
+
+    :param query: text of the query
+    :return: list of str
+    """
+    typed = [query[:size] for size in range(1, len(query) + 1)]
+    return typed + typed[-2::-1]
+
+
+def run(texts, query, changes=1000, seed=None) -> dict:
+    """
+    Run the benchmark.
+
+    :param texts: row texts
+    :param query: text of the query
+    :param changes: number of the changed rows
+    :param seed: random seed of the changes
+    :return: report
+    """
+    keys = get_keys(query)
+    report = {"rows": len(texts), "query": query, "keys": len(keys)}
+
+    started = time.perf_counter()
+    for key in keys:
+        [position for position, text in enumerate(texts) if key in text]
+    report["scan"] = round((time.perf_counter() - started) * 1000 / len(keys), 3)
+
+    index = FilterIndex(enumerate(texts))
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        index.find(key)
+        timings.append((time.perf_counter() - started) * 1000)
+    report["indexed"] = round(sum(timings) / len(timings), 3)
+    report["indexed_max"] = round(max(timings), 3)
+    report["matches"] = len(index.find(query))
+
+    rnd = random.Random(seed)
+    changed = [(rnd.randrange(len(texts)), rnd.choice(texts)) for _ in range(changes)]
+    started = time.perf_counter()
+    for position, text in changed:
+        index.set_text(position, text)
+        index.find(query)
+    report["update"] = round((time.perf_counter() - started) * 1000 / changes, 3)
+
+    started = time.perf_counter()
+    FilterIndex(enumerate(texts)).find(query)
+    report["rebuild"] = round((time.perf_counter() - started) * 1000, 3)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the incremental table filter")
+    parser.add_argument("--rows", type=int, default=100000, help="number of the rows")
+    parser.add_argument("--query", default="host-0042", help="query to type")
+    parser.add_argument("--changes", type=int, default=1000, help="number of the changed rows")
+    parser.add_argument("--seed", type=int, default=None, help="random seed of the rows")
+    parser.add_argument("--json", action="store_true", help="print report as JSON")
+    args = parser.parse_args()
+
+    report = run(get_texts(args.rows, seed=args.seed), args.query, changes=args.changes, seed=args.seed)
+    if args.json:
+        sys.stdout.write(json.dumps(report) + "\n")
+    else:
+        sys.stdout.write("Rows:   {rows}, query '{query}', {keys} keys\n"
+                         "Scan:   {scan} ms per key\n"
+                         "Index:  {indexed} ms per key, max {indexed_max} ms, {matches} matches\n"
+                         "Update: {update} ms per changed row, {rebuild} ms to make the index again\n".format(**report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# coding: utf-8
+"""
+Benchmark of the table row highlighting.
+
+Highlights a full screen of rows like the Result Details ones with a large
+highlight map, and reports milliseconds per screen of the Highlighter (first
+and repeated screens) and of the previous per-substring search:
+
+    python -m sugarui.devel.highlightbench --rows 50 --keys 1000
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import types
+
+from sugarui.widgets.textfields import Highlighter
+
+STATUSES = ("failed", "success", "warnings")
+
+
+def get_highlight_map(keys, seed=None) -> dict:
+    """
+    Generate highlight map: the statuses and the host names.
+
+    :param keys: number of the host names
+    :param seed: random seed
+    :return: dict
+    """
+    rnd = random.Random(seed)
+    highlight_map = {"host-{:04d}".format(idx): rnd.choice(("DANGER", "GOOD", "WARNING")) for idx in range(keys)}
+    highlight_map.update({"failed": "DANGER", "success": "GOOD", "warnings": "WARNING"})
+
+    return highlight_map
+
+
+def get_rows(rows, width, hosts, seed=None) -> list:
+    """
+    Generate formatted rows.
+
+    :param rows: number of the rows
+    :param width: width of the rows
+    :param hosts: number of the host names
+    :param seed: random seed
+    :return: list of str
+    """
+    rnd = random.Random(seed)
+    return [" host-{:04d}.example.com │ {} │ 2026-10-18 11:{:02d} ".format(
+        rnd.randrange(hosts * 2), rnd.choice(STATUSES), idx % 60).ljust(width) for idx in range(rows)]
+
+
+def colorise_legacy(widget, text, highlight_map) -> list:
+    """
+    Highlight the text by the previous algorithm: the first occurrence of each substring.
+
+    :param widget: widget, resolving the colors
+    :param text: text to highlight
+    :param highlight_map: dict of the substrings to the color names
+    :return: list of attributes
+    """
+    hldata = [0 for _ in range(len(text))]
+    for value in highlight_map:
+        offset = text.find(value)
+        if offset > -1:
+            hl_colorc = widget.parent.theme_manager.findPair(widget, highlight_map[value])
+            hldata = hldata[:offset] + [hl_colorc for _ in range(len(value))] + hldata[offset + len(value):]
+    return hldata
+
+
+def run(rows, highlight_map, width, screens=100) -> dict:
+    """
+    Run the benchmark.
+
+    :param rows: formatted rows of the screen
+    :param highlight_map: dict of the substrings to the color names
+    :param width: width of the rows
+    :param screens: number of the repeated screens
+    :return: report
+    """
+    # Stands for the widget: the colors are resolved by the theme manager of its form
+    colors = {"DANGER": 1, "GOOD": 2, "WARNING": 3}
+    theme_manager = types.SimpleNamespace(findPair=lambda widget, color: colors[color])
+    widget = types.SimpleNamespace(parent=types.SimpleNamespace(theme_manager=theme_manager))
+    report = {"rows": len(rows), "keys": len(highlight_map), "width": width}
+
+    started = time.perf_counter()
+    for _ in range(max(1, screens // 10)):
+        for text in rows:
+            colorise_legacy(widget, text, highlight_map)
+    report["legacy"] = round((time.perf_counter() - started) * 1000 / max(1, screens // 10), 3)
+
+    started = time.perf_counter()
+    highlighter = Highlighter(highlight_map)
+    report["compile"] = round((time.perf_counter() - started) * 1000, 3)
+
+    started = time.perf_counter()
+    for text in rows:
+        highlighter.highlight(widget, text, width)
+    report["first"] = round((time.perf_counter() - started) * 1000, 3)
+
+    started = time.perf_counter()
+    for _ in range(screens):
+        for text in rows:
+            highlighter.highlight(widget, text, width)
+    report["cached"] = round((time.perf_counter() - started) * 1000 / screens, 3)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the table row highlighting")
+    parser.add_argument("--rows", type=int, default=50, help="rows of the screen")
+    parser.add_argument("--width", type=int, default=120, help="width of the rows")
+    parser.add_argument("--keys", type=int, default=1000, help="host names in the highlight map")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--json", action="store_true", help="print report as JSON")
+    args = parser.parse_args()
+
+    report = run(get_rows(args.rows, args.width, args.keys, seed=args.seed),
+                 get_highlight_map(args.keys, seed=args.seed), args.width)
+    if args.json:
+        sys.stdout.write(json.dumps(report) + "\n")
+    else:
+        sys.stdout.write("Screen:   {rows} rows of {width}, {keys} substrings\n"
+                         "Legacy:   {legacy} ms per screen\n"
+                         "Compiled: {compile} ms once, {first} ms first screen, {cached} ms repeated\n".format(**report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# coding: utf-8
+"""
+Benchmark of the keystroke-to-paint time of the text fields.
+
+Types a long query into VisualTextField, like the query of the Module Runner,
+and measures each key from the input handling to the painted field ("paint")
+and to the refreshed screen ("total"). The previous per-character rendering
+is measured the same way.
+Runs in the terminal, the report is printed after the screen is restored:
+
+    python -m sugarui.devel.inputbench --length 400
+"""
+import sys
+import json
+import time
+import curses
+import argparse
+import npyscreen
+
+from sugarui.widgets.textfields import VisualTextField, ConcealedVisualTextField
+
+
+def field_space_legacy(widget) -> None:
+    """
+    Fill the field by one character at a time.
+
+    :param widget: text field
+    :return: None
+    """
+    line = " " * widget.width
+    widget.add_line(widget.rely, widget.relx, line, widget.make_attributes_list(
+        line, widget.parent.theme_manager.findPair(
+            widget, widget.color) | curses.A_STANDOUT | curses.A_BOLD | curses.A_DIM), widget.width)
+
+
+class LegacyVisualTextField(VisualTextField):
+    """
+    VisualTextField, printing the value by one character at a time.
+    """
+    def _print(self):
+        field_space_legacy(self)
+        npyscreen.Textfield._print(self)
+
+
+class LegacyConcealedVisualTextField(ConcealedVisualTextField):
+    """
+    ConcealedVisualTextField, printing the mask by one character at a time.
+    """
+    def _print(self):
+        field_space_legacy(self)
+        color = self._get_color()
+        for idx in range(min(len(self.value), self.maximum_string_length)):
+            self.parent.curses_pad.addstr(self.rely, self.relx + idx, self._mask, color)
+
+
+class InputBench(npyscreen.NPSApp):
+    """
+    Benchmark application.
+    """
+    FIELDS = (
+        ("visual", VisualTextField),
+        ("visual_legacy", LegacyVisualTextField),
+        ("concealed", ConcealedVisualTextField),
+        ("concealed_legacy", LegacyConcealedVisualTextField),
+    )
+
+    def __init__(self, length):
+        """
+        :param length: number of the typed characters
+        """
+        self.length = length
+        self.report = {"length": length}
+
+    def main(self):
+        form = npyscreen.FormBaseNew(name="Input benchmark")
+        for name, field in self.FIELDS:
+            widget = form.add(field, value="")
+            widget.editing = True
+            widget._last_get_ch_was_unicode = False  # Set by npyscreen, reading the key from the terminal
+            form.display()
+            paints, totals = [], []
+            for idx in range(self.length):
+                started = time.perf_counter()
+                widget.handle_input(ord("a") + idx % 26)
+                widget.update()
+                painted = time.perf_counter()
+                form.refresh()
+                paints.append(painted - started)
+                totals.append(time.perf_counter() - started)
+            self.report[name] = {"paint": self.get_stats(paints), "total": self.get_stats(totals)}
+            widget.editing = False
+            widget.hidden = True
+
+    @staticmethod
+    def get_stats(timings) -> dict:
+        """
+        Get statistics of the timings in milliseconds.
+
+        :param timings: seconds
+        :return: dict
+        """
+        timings = sorted(timings)
+        return {
+            "mean": round(sum(timings) / len(timings) * 1000, 3),
+            "p50": round(timings[len(timings) // 2] * 1000, 3),
+            "p99": round(timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1000, 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the keystroke-to-paint time of the text fields")
+    parser.add_argument("--length", type=int, default=400, help="number of the typed characters")
+    args = parser.parse_args()
+
+    bench = InputBench(args.length)
+    bench.run()
+    sys.stdout.write(json.dumps(bench.report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# coding: utf-8
+"""
+Load test of the Sugar API client.
+
+Runs SugarAPIClient calls of a scenario at the target concurrency and reports
+latency percentiles and throughput. The master is either a running one (--url),
+or the local fake master, started in the process:
+
+    python -m sugarui.devel.loadtest --scenario record --concurrency 16 --requests 5000 \
+        --systems 10000 --latency 0.02 --jitter 0.01
+
+Scenario "batch" sends the same records as "records", but in one round trip,
+so these two compare the batched and the sequential fetch under load.
+Comparison at fixed round-trip times is done by sugarui.devel.batchbench.
+
+Identical concurrent calls are coalesced by the client, so only some of them
+reach the master. By default the scenario runs twice, with the coalescing
+("single flight on") and without it ("off"), when every call reaches the master.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import concurrent.futures
+
+from sugarui.apiconnector import SugarAPIClient, SingleFlight, Systems
+from sugarui.devel import fakemaster
+
+
+class LoadTest:
+    """
+    Load test of the API client.
+    """
+    SCENARIOS = ("status", "stream", "sync", "record", "records", "batch", "history")
+
+    def __init__(self, api, scenario, concurrency=8, requests=1000, duration=None, batch_size=20,
+                 single_flight=True):
+        """
+        :param api: SugarAPIClient
+        :param scenario: name of the scenario, one of SCENARIOS
+        :param concurrency: number of threads, calling the API at once
+        :param requests: number of the scenario calls
+        :param duration: seconds to run instead of the number of calls
+        :param batch_size: number of records in "records" and "batch" scenarios
+        :param single_flight: coalesce identical concurrent calls, as the client does
+        """
+        if scenario not in self.SCENARIOS:
+            raise ValueError("Unknown scenario '{}'".format(scenario))
+        self.api = api
+        self.scenario = scenario
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.batch_size = batch_size
+        self.single_flight = single_flight
+        self._ids = []
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._latencies = []
+        self._errors = {}
+
+    def _scenario_status(self):
+        self.api.systems.get_status()
+
+    def _scenario_stream(self):
+        for _ in self.api.systems.iter_status():
+            pass
+
+    def _scenario_sync(self):
+        self.api.systems.sync()
+
+    def _scenario_record(self):
+        self.api.systems.get_record(random.choice(self._ids))
+
+    def _scenario_records(self):
+        for sid in random.sample(self._ids, min(self.batch_size, len(self._ids))):
+            self.api.systems.get_record(sid)
+
+    def _scenario_batch(self):
+        batch = self.api.batch()
+        for sid in random.sample(self._ids, min(self.batch_size, len(self._ids))):
+            batch.add(Systems._get_system_uri(sid))
+        for future in batch.execute():
+            future.result()
+
+    def _scenario_history(self):
+        for _ in self.api.jobs.iter_history():
+            pass
+
+    def _next(self, deadline) -> bool:
+        """
+        Reserve the next call.
+
+        :param deadline: monotonic time to stop at, None to stop after the number of requests
+        :return: False, if the test is over
+        """
+        if deadline is not None:
+            return time.monotonic() < deadline
+        with self._lock:
+            self._issued += 1
+            return self._issued <= self.requests
+
+    def _worker(self, deadline) -> None:
+        """
+        Call the scenario until the test is over.
+
+        :param deadline: monotonic time to stop at
+        :return: None
+        """
+        scenario = getattr(self, "_scenario_{}".format(self.scenario))
+        while self._next(deadline):
+            started = time.perf_counter()
+            try:
+                scenario()
+            except Exception as ex:
+                error = ex.__class__.__name__
+                with self._lock:
+                    self._errors[error] = self._errors.get(error, 0) + 1
+            else:
+                latency = time.perf_counter() - started
+                with self._lock:
+                    self._latencies.append(latency)
+
+    @staticmethod
+    def _percentile(values, pct) -> float:
+        """
+        Get percentile of the sorted values in milliseconds.
+
+        :param values: sorted seconds
+        :param pct: percentile, 0 to 100
+        :return: milliseconds
+        """
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 3)
+
+    def run(self) -> dict:
+        """
+        Run the test.
+
+        :return: report
+        """
+        if self.scenario in ("record", "records", "batch"):
+            self._ids = [system.id for system in self.api.systems.get_status()]
+            if not self._ids:
+                raise ValueError("Master has no systems")
+
+        # Own coalescing of the test, counting only its calls
+        single_flight, self.api.single_flight = self.api.single_flight, SingleFlight(enabled=self.single_flight)
+        deadline = time.monotonic() + self.duration if self.duration else None
+        started = time.perf_counter()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for _ in range(self.concurrency):
+                    executor.submit(self._worker, deadline)
+            elapsed = time.perf_counter() - started
+        finally:
+            single_flight, self.api.single_flight = self.api.single_flight, single_flight
+
+        latencies = sorted(self._latencies)
+        return {
+            "scenario": self.scenario,
+            "concurrency": self.concurrency,
+            "single_flight_enabled": self.single_flight,
+            "calls": len(latencies),
+            "errors": dict(self._errors),
+            "seconds": round(elapsed, 3),
+            "throughput": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            "p50": self._percentile(latencies, 50),
+            "p95": self._percentile(latencies, 95),
+            "p99": self._percentile(latencies, 99),
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            "single_flight": single_flight.get_stats(),
+        }
+
+
+def get_report(report) -> str:
+    """
+    Format report as text.
+
+    :param report: report of the load test
+    :return: text
+    """
+    errors = ", ".join("{}: {}".format(*error) for error in sorted(report["errors"].items())) or "none"
+    return "\n".join([
+        "Scenario:     {}, concurrency {}, single flight {}".format(
+            report["scenario"], report["concurrency"], "on" if report["single_flight_enabled"] else "off"),
+        "Calls:        {calls} in {seconds}s, {throughput} calls/s".format(**report),
+        "Errors:       {}".format(errors),
+        "Latency (ms): mean {mean}, p50 {p50}, p95 {p95}, p99 {p99}, max {max}".format(**report),
+        "Shared calls: {shared} of {calls}".format(**report["single_flight"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the Sugar API client")
+    parser.add_argument("--url", help="root URL of a running master. Default starts the local fake master.")
+    parser.add_argument("--scenario", choices=LoadTest.SCENARIOS, default="status", help="API calls to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent calls")
+    parser.add_argument("--requests", type=int, default=1000, help="number of scenario calls")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run instead of the number of calls")
+    parser.add_argument("--batch-size", type=int, default=20, help="records of 'records' and 'batch' scenarios")
+    parser.add_argument("--single-flight", choices=("on", "off", "both"), default="both",
+                        help="coalesce identical concurrent calls, or run with and without it")
+    parser.add_argument("--json", action="store_true", help="print report as JSON")
+    fakemaster.get_arg_parser(parser)
+    args = parser.parse_args()
+
+    from sugar.config import get_config
+
+    master = None if args.url else fakemaster.get_master(args).start()
+    api = SugarAPIClient(get_config(), url=args.url or master.url, pool_size=max(args.concurrency, 10))
+    reports = []
+    try:
+        for single_flight in {"on": (True,), "off": (False,), "both": (True, False)}[args.single_flight]:
+            reports.append(LoadTest(api, args.scenario, concurrency=args.concurrency, requests=args.requests,
+                                    duration=args.duration, batch_size=args.batch_size,
+                                    single_flight=single_flight).run())
+    finally:
+        api.close()
+        if master is not None:
+            master.stop()
+
+    for report in reports:
+        sys.stdout.write((json.dumps(report) if args.json else get_report(report) + "\n") + "\n")
+
+
+if __name__ == "__main__":
+    main()
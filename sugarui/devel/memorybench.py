@@ -0,0 +1,100 @@
+# coding: utf-8
+"""
+Benchmark of the memory of the inventory.
+
+Synchronises the inventory of the local fake master by "Systems.sync",
+as the UI does, and reports the memory, measured by tracemalloc:
+
+  - "inventory": kept after the sync (compact records and their index)
+  - "cache": part of it, kept by the response cache
+  - "peak": peak during the sync, while the decoded document is alive
+  - "records": the decoded status document, if it were kept instead of the compact records
+
+    python -m sugarui.devel.memorybench --systems 100000
+"""
+import gc
+import sys
+import json
+import argparse
+import tracemalloc
+
+from sugarui.apiconnector import SugarAPIClient
+from sugarui.devel.fakemaster import FakeMaster
+
+
+def get_size(size, systems) -> dict:
+    """
+    Get size report.
+
+    :param size: bytes
+    :param systems: number of the systems
+    :return: dict
+    """
+    return {"mib": round(size / 0x100000, 1), "bytes_per_system": size // max(systems, 1)}
+
+
+def get_traced() -> int:
+    """
+    Get currently allocated bytes, after the garbage is collected.
+
+    :return: bytes
+    """
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def run(systems, seed=None) -> dict:
+    """
+    Run the benchmark.
+
+    :param systems: number of the systems
+    :param seed: random seed of the fleet
+    :return: report
+    """
+    from sugar.config import get_config
+
+    with FakeMaster(systems=systems, history=0, seed=seed).start() as master:
+        api = SugarAPIClient(get_config(), url=master.url)
+        try:
+            tracemalloc.start()
+            started = get_traced()
+            api.systems.sync()
+            inventory = get_traced()
+            peak = tracemalloc.get_traced_memory()[1]
+            api.cache.invalidate()
+            cache = max(inventory - get_traced(), 0)
+
+            started_records = get_traced()
+            doc = api.systems._fetch("/clients/status", {})
+            records = get_traced() - started_records
+            del doc
+            tracemalloc.stop()
+        finally:
+            api.close()
+
+    return {
+        "systems": systems,
+        "inventory": get_size(inventory - started, systems),
+        "cache": get_size(cache, systems),
+        "peak": get_size(peak - started, systems),
+        "records": get_size(records, systems),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the memory of the inventory")
+    parser.add_argument("--systems", type=int, default=100000, help="number of the systems")
+    parser.add_argument("--seed", type=int, default=None, help="random seed of the fleet")
+    parser.add_argument("--json", action="store_true", help="print report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.systems, seed=args.seed)
+    if args.json:
+        sys.stdout.write(json.dumps(report) + "\n")
+    else:
+        sys.stdout.write("".join("{:10} {mib} MiB, {bytes_per_system} bytes per system\n".format(
+            name.capitalize() + ":", **report[name]) for name in ("inventory", "cache", "peak", "records")))
+
+
+if __name__ == "__main__":
+    main()
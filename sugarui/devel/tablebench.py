@@ -0,0 +1,152 @@
+# coding: utf-8
+"""
+Benchmark of the table row formatting per frame.
+
+Scrolls the table over the rows like the System Overview ones, one line
+per frame, and measures formatting of the displayed rows ("format") and
+the whole repaint of the table ("frame") with the cache of the formatted
+rows and without it. Header formatting is measured the same way.
+With "--churn", rows are also changed on every frame as by the live updates
+("upsert"), half of them displayed. Runs in the terminal, the report
+is printed after the screen is restored:
+
+    python -m sugarui.devel.tablebench --rows 100000 --frames 600 --churn 4
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import npyscreen
+
+from sugarui.widgets.table import Table, TableHeader
+
+
+class UncachedTable(Table):
+    """
+    Table, formatting each displayed row on every frame.
+    """
+    def display_value(self, row_data):
+        return self._format_row(row_data)
+
+
+class UncachedTableHeader(TableHeader):
+    """
+    Table header, formatting its lines on every frame.
+    """
+    def _get_lines(self) -> tuple:
+        self._lines = None
+        return TableHeader._get_lines(self)
+
+
+class TableBench(npyscreen.NPSApp):
+    """
+    Benchmark application.
+    """
+    TABLES = (
+        ("cached", Table, TableHeader),
+        ("uncached", UncachedTable, UncachedTableHeader),
+    )
+
+    def __init__(self, rows, frames, churn=0, seed=None):
+        """
+        :param rows: number of the table rows
+        :param frames: number of the scrolled frames
+        :param churn: number of the rows, changed on each frame
+        :param seed: random seed of the changes
+        """
+        self.rows = [("client-{:06d}.example.lan".format(idx), "online" if idx % 7 else "offline",
+                      "openSUSE Leap 15.0", idx) for idx in range(rows)]
+        self.frames = frames
+        self.churn = churn
+        self.seed = seed
+        self.report = {"rows": rows, "frames": frames, "churn": churn}
+
+    def change_rows(self, table, rnd, offset, display_length) -> None:
+        """
+        Change the rows, half of them displayed, as the live updates do.
+
+        :param table: Table
+        :param rnd: random generator
+        :param offset: position of the first displayed row
+        :param display_length: number of the displayed rows
+        :return: None
+        """
+        changed = []
+        for idx in range(self.churn):
+            if idx % 2:
+                position = rnd.randrange(len(table.values))
+            else:
+                position = rnd.randrange(offset, min(offset + display_length, len(table.values)))
+            host, status, os_name, serial = table.values[position]
+            changed.append((host, "offline" if status == "online" else "online", os_name, serial))
+        table.upsert(changed)
+
+    def main(self):
+        for name, table_class, header_class in self.TABLES:
+            form = npyscreen.FormBaseNew(name="Table benchmark")
+            header = form.add(header_class, headers=["Hostname", "Status", "OS", "Serial"], title="Systems",
+                              max_height=2, rely=1)
+            table = form.add(table_class, rely=3, max_height=40, row_key=lambda row: row[0])
+            table.load_data(list(self.rows))
+            form.display()
+
+            rnd = random.Random(self.seed)
+            formats, frames, headers, changes = [], [], [], []
+            display_length = len(table._my_widgets)
+            for offset in range(self.frames):
+                if self.churn:
+                    started = time.perf_counter()
+                    self.change_rows(table, rnd, offset, display_length)
+                    changes.append(time.perf_counter() - started)
+                table.start_display_at = table.cursor_line = offset
+                started = time.perf_counter()
+                for row in table.values[offset:offset + display_length]:
+                    table.display_value(row)
+                formats.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                table.update(clear=False)
+                frames.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                header.update(clear=False)
+                headers.append(time.perf_counter() - started)
+                form.refresh()
+
+            self.report[name] = {"format": self.get_stats(formats), "frame": self.get_stats(frames),
+                                 "header": self.get_stats(headers)}
+            if changes:
+                self.report[name]["upsert"] = self.get_stats(changes)
+
+    @staticmethod
+    def get_stats(timings) -> dict:
+        """
+        Get statistics of the timings in milliseconds.
+
+        :param timings: seconds
+        :return: dict
+        """
+        timings = sorted(timings)
+        return {
+            "mean": round(sum(timings) / len(timings) * 1000, 3),
+            "p50": round(timings[len(timings) // 2] * 1000, 3),
+            "p99": round(timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1000, 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the table row formatting per frame")
+    parser.add_argument("--rows", type=int, default=100000, help="number of the table rows")
+    parser.add_argument("--frames", type=int, default=600, help="number of the scrolled frames")
+    parser.add_argument("--churn", type=int, default=0, help="number of the rows, changed on each frame")
+    parser.add_argument("--seed", type=int, default=None, help="random seed of the changes")
+    args = parser.parse_args()
+
+    bench = TableBench(args.rows, args.frames, churn=args.churn, seed=args.seed)
+    bench.run()
+    sys.stdout.write(json.dumps(bench.report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
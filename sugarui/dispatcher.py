@@ -0,0 +1,109 @@
+# coding: utf-8
+"""
+Dispatcher of the UI calls from the background threads.
+
+Widgets are painted by curses, which is not thread-safe, so the API threads
+never touch them: they post callbacks, which are called on the UI loop.
+The queue is bounded: the producers wait while it is full, so they cannot
+outpace the rendering, and the UI loop spends only a limited time per tick
+on the calls, so the keys stay responsive.
+"""
+import time
+import threading
+import collections
+
+
+class UIDispatcher:
+    """
+    Bounded queue of the UI calls, shared by the forms of the application.
+    """
+    MAX_CALLS = 1024  # Pending calls, before the producers are blocked
+    TICK_BUDGET = 0.05  # Seconds of the UI loop for the calls per tick
+
+    def __init__(self, max_calls=None, budget=None):
+        """
+        Must be created on the UI thread.
+
+        :param max_calls: maximum of the pending calls. Default is MAX_CALLS.
+        :param budget: seconds of the calls per tick. Default is TICK_BUDGET.
+        """
+        self.max_calls = max_calls or self.MAX_CALLS
+        self.budget = budget or self.TICK_BUDGET
+        self._thread = threading.get_ident()
+        self._calls = collections.deque()  # [callback, args, key]
+        self._keyed = {}  # key to the pending call
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._stats = {"posted": 0, "coalesced": 0, "called": 0, "blocked": 0, "deferred": 0, "max_pending": 0}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def post(self, callback, *args, key=None) -> None:
+        """
+        Call the callback later on the UI loop.
+        Background threads wait, while the queue is full. The UI thread never waits,
+        so the callbacks may post further calls.
+
+        :param callback: callable
+        :param args: arguments to the callable
+        :param key: calls of the same key are coalesced: the pending call gets the latest arguments
+        :return: None
+        """
+        with self._lock:
+            self._stats["posted"] += 1
+            while True:
+                call = self._keyed.get(key) if key is not None else None
+                if call is not None:
+                    call[0], call[1] = callback, args
+                    self._stats["coalesced"] += 1
+                    return
+                if len(self._calls) < self.max_calls or threading.get_ident() == self._thread:
+                    break
+                self._stats["blocked"] += 1
+                self._not_full.wait()
+
+            call = [callback, args, key]
+            self._calls.append(call)
+            if key is not None:
+                self._keyed[key] = call
+            self._stats["max_pending"] = max(self._stats["max_pending"], len(self._calls))
+
+    def process(self) -> int:
+        """
+        Call the pending callbacks on the UI loop, until the time budget of the tick is spent.
+        At least one callback is called, the rest is left to the next ticks.
+
+        :return: number of the called callbacks
+        """
+        called = 0
+        started = time.monotonic()
+        while not called or time.monotonic() - started < self.budget:
+            with self._lock:
+                if not self._calls:
+                    break
+                callback, args, key = self._calls.popleft()
+                if key is not None:
+                    del self._keyed[key]
+                self._not_full.notify()
+            callback(*args)
+            called += 1
+
+        with self._lock:
+            self._stats["called"] += called
+            self._stats["deferred"] += bool(self._calls)
+
+        return called
+
+    def get_stats(self) -> dict:
+        """
+        Get counters of the calls.
+
+        :return: dict of the posted calls, coalesced by the key, called, producers blocked by the full queue,
+                 ticks with the calls left over the budget, the most and the current pending calls
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._calls)
+
+        return stats
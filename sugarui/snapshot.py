@@ -0,0 +1,151 @@
+# coding: utf-8
+"""
+Local snapshot of the last known API data.
+
+The inventory of the systems and the job history are kept in the SQLite file,
+so the forms are populated right away on the next start, before the master answers.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class Snapshot:
+    """
+    SQLite snapshot of the inventory and the job history.
+    """
+    SCHEMA_VERSION = 1
+    SCHEMA = (
+        "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)",
+        "CREATE TABLE systems (id TEXT PRIMARY KEY, host TEXT NOT NULL, online INTEGER NOT NULL, os TEXT) "
+        "WITHOUT ROWID",
+        "CREATE TABLE jobs (seq INTEGER PRIMARY KEY, doc TEXT NOT NULL)",
+    )
+
+    def __init__(self, path):
+        """
+        :param path: path to the snapshot file. Missing directories are created.
+        :raises OSError: if the file can't be created or removed
+        :raises sqlite3.Error: if the file can't be opened
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            self._db = self._open()
+        except sqlite3.OperationalError:
+            raise  # E.g. the file can't be opened or is locked, so it is not broken
+        except sqlite3.DatabaseError:
+            # Broken file is only a cache, so it is started over
+            os.unlink(path)
+            self._db = self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        """
+        Open the snapshot, creating the schema if the file is new or of another schema version.
+
+        :return: sqlite3.Connection
+        """
+        db = sqlite3.connect(self.path, check_same_thread=False)  # Written from the API threads under the lock
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            if db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                with db:
+                    for table in ("meta", "systems", "jobs"):
+                        db.execute("DROP TABLE IF EXISTS {}".format(table))
+                    for statement in self.SCHEMA:
+                        db.execute(statement)
+                    db.execute("PRAGMA user_version={:d}".format(self.SCHEMA_VERSION))
+        except sqlite3.Error:
+            db.close()
+            raise
+
+        return db
+
+    def _set_meta(self, **values) -> None:
+        """
+        Set metadata values. Must be called in a transaction.
+
+        :param values: keys and JSON-serialisable values
+        :return: None
+        """
+        self._db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [(key, json.dumps(value)) for key, value in values.items()])
+
+    def get_meta(self, key, default=None):
+        """
+        Get metadata value.
+
+        :param key: key of the value
+        :param default: value, if there is no such key
+        :return: value
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return default if row is None else json.loads(row[0])
+
+    def load_systems(self) -> tuple:
+        """
+        Load the inventory.
+
+        :return: tuple of the revision of the inventory and the list of system records
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT id, host, online, os FROM systems").fetchall()
+
+        return self.get_meta("revision"), [{"id": sid, "host": host, "online": bool(online), "os": os_name}
+                                           for sid, host, online, os_name in rows]
+
+    def save_systems(self, systems, removed=(), revision=None, full=False) -> None:
+        """
+        Save systems of the inventory.
+
+        :param systems: list of systems (objects with "id", "host", "online" and "os")
+        :param removed: list of IDs of the removed systems
+        :param revision: revision of the inventory, None if unknown
+        :param full: systems are the complete inventory, replacing the previous one
+        :return: None
+        """
+        with self._lock, self._db:
+            if full:
+                self._db.execute("DELETE FROM systems")
+            self._db.executemany("INSERT OR REPLACE INTO systems (id, host, online, os) VALUES (?, ?, ?, ?)",
+                                 [(system.id, system.host, int(system.online), system.os) for system in systems])
+            self._db.executemany("DELETE FROM systems WHERE id = ?", [(sid,) for sid in removed])
+            self._set_meta(revision=revision, systems_saved=time.time())
+
+    def load_jobs(self) -> list:
+        """
+        Load the job history.
+
+        :return: list of jobs, newest first
+        """
+        with self._lock:
+            return [json.loads(doc) for doc, in self._db.execute("SELECT doc FROM jobs ORDER BY seq")]
+
+    def save_jobs(self, jobs) -> None:
+        """
+        Replace the job history.
+
+        :param jobs: list of jobs, newest first
+        :return: None
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs")
+            self._db.executemany("INSERT INTO jobs (seq, doc) VALUES (?, ?)",
+                                 [(seq, json.dumps(job)) for seq, job in enumerate(jobs)])
+            self._set_meta(jobs_saved=time.time())
+
+    def close(self) -> None:
+        """
+        Close the snapshot file.
+
+        :return: None
+        """
+        with self._lock:
+            self._db.close()
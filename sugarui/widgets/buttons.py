@@ -5,9 +5,10 @@ Enhanced npyscreen buttons.
 import curses
 import curses.ascii
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 
 
-class ClickButton(npyscreen.widget.Widget):
+class ClickButton(DamageMixin, npyscreen.widget.Widget):
     """
     Button with callback
     """
@@ -5,9 +5,10 @@ Checkbox widget.
 import curses
 import curses.ascii
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 
 
-class CheckBox(npyscreen.widget.Widget):
+class CheckBox(DamageMixin, npyscreen.widget.Widget):
     """
     Checkbox implementation.
     """
@@ -3,11 +3,12 @@
 Compound controllers.
 """
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 from sugarui.widgets.buttons import ClickButton
 from sugarui.windows.floating import HelpForm
 
 
-class WidgetHelp(npyscreen.widget.Widget):
+class WidgetHelp(DamageMixin, npyscreen.widget.Widget):
     """
     Controller that also adds help button and displays floating help form
     for the particular widget. Example:
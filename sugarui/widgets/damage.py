@@ -0,0 +1,88 @@
+# coding: utf-8
+"""
+Damage tracking of the widgets.
+
+SugarForm paints the screen by frames (see "SugarForm.refresh"): a widget is
+repainted only if it is invalidated, or its displayed state is changed since
+it was painted. Widgets describe their displayed state by "get_damage_state".
+"""
+
+
+def get_widget_state(widget) -> tuple:
+    """
+    Get displayed state of any widget: the geometry, the focus and the value.
+    Values are compared as they are, so the values, changed in place, need "invalidate".
+
+    :param widget: npyscreen widget
+    :return: tuple
+    """
+    return (widget.hidden, widget.editing, getattr(widget, "highlight", None), widget.rely, widget.relx,
+            widget.width, widget.height, getattr(widget, "color", None), getattr(widget, "value", None))
+
+
+class DamageMixin:
+    """
+    Mix-in for the damage tracking of the widget.
+    It must precede the npyscreen widget class in the bases.
+    """
+    damaged = True  # Widget is repainted on the next frame
+    _painted_state = None
+
+    def invalidate(self) -> None:
+        """
+        Repaint the widget on the next frame.
+
+        :return: None
+        """
+        self.damaged = True
+
+    def get_damage_state(self) -> tuple:
+        """
+        Get displayed state of the widget. Subclasses add the state, which is not the value, e.g. the title.
+
+        :return: tuple
+        """
+        return get_widget_state(self)
+
+    def is_damaged(self) -> bool:
+        """
+        Check if the widget is to be repainted.
+
+        :return: bool
+        """
+        return self.damaged or self.get_damage_state() != self._painted_state
+
+    def painted(self) -> None:
+        """
+        Mark the widget as displayed in its current state.
+
+        :return: None
+        """
+        self.damaged = False
+        self._painted_state = self.get_damage_state()
+
+    def request_frame(self) -> None:
+        """
+        Repaint the live updated widget by a frame of the form at the capped rate (see "SugarForm.request_frame"),
+        or right away on the forms without frames.
+
+        :return: None
+        """
+        request = getattr(self.parent, "request_frame", None)
+        if request is None:
+            self.display()
+        else:
+            request()
+
+    def display(self):
+        """
+        Repaint the widget right away, e.g. while it is edited, and refresh the screen.
+
+        :return:
+        """
+        if self.hidden:
+            self.clear()
+        else:
+            self.update()
+        self.painted()
+        self.parent.refresh()
@@ -4,9 +4,10 @@ Vertical divider.
 """
 import curses
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 
 
-class Divider(npyscreen.widget.Widget):
+class Divider(DamageMixin, npyscreen.widget.Widget):
     """
     Adds an empty space.
     Allows text and line(s)
@@ -53,6 +54,9 @@ class Divider(npyscreen.widget.Widget):
         self._title = title
         self._background = background
 
+    def get_damage_state(self) -> tuple:
+        return super(Divider, self).get_damage_state() + (self._title, self._background)
+
     def update(self, clear=True):
         """
         Update widget.
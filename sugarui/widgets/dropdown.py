@@ -6,6 +6,7 @@ from a pop-up window below.
 import curses
 import npyscreen
 from sugarui.widgets.buttons import ClickButton
+from sugarui.widgets.damage import DamageMixin
 
 
 class _DropDownTextItem(npyscreen.Textfield):
@@ -126,7 +127,7 @@ class _DropDownPopup(npyscreen.fmForm.FormBaseNew):
         self.edit()
 
 
-class DropDown(npyscreen.widget.Widget):
+class DropDown(DamageMixin, npyscreen.widget.Widget):
     """
     Drop-down.
     """
@@ -4,9 +4,10 @@ Progress bar widget
 """
 import curses
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 
 
-class ProgressBar(npyscreen.wgwidget.Widget):
+class ProgressBar(DamageMixin, npyscreen.wgwidget.Widget):
     """
     Progress bar
     """
@@ -41,10 +42,10 @@ class ProgressBar(npyscreen.wgwidget.Widget):
 
     def set_value(self, value):
         """
-        Set percentage value.
+        Set percentage value. Rapid changes are coalesced into the frames of the form.
 
         :param value:
         :return:
         """
         self.value = value
-        self.display()
+        self.request_frame()
@@ -11,6 +11,7 @@ My Choices:  ( ) One
 """
 import curses
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 
 
 class _ConstrainedOption(npyscreen.widget.Widget):
@@ -55,7 +56,7 @@ class _ConstrainedOption(npyscreen.widget.Widget):
                           self.width)
 
 
-class RadioChoice(npyscreen.MultiLine):
+class RadioChoice(DamageMixin, npyscreen.MultiLine):
     """
     Radio choice container widget.
     """
@@ -71,6 +72,10 @@ class RadioChoice(npyscreen.MultiLine):
         self._my_widgets = []
         npyscreen.MultiLine.__init__(self, *args, **kwargs)
 
+    def get_damage_state(self) -> tuple:
+        return super(RadioChoice, self).get_damage_state() + (
+            self.values, self.cursor_line, self.start_display_at, tuple(widget.selected for widget in self._my_widgets))
+
     def get_height(self):
         """
         Return actual painted hight.
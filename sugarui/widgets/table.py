@@ -2,10 +2,14 @@
 """
 Table display
 """
+import array
 import curses
+import collections
 import npyscreen
 import npyscreen.wgwidget
 from sugarui.widgets.textfields import ColoredTextField
+from sugarui.widgets.tablefilter import FilterIndex
+from sugarui.widgets.damage import DamageMixin
 
 npyscreen.wgmultiline.MORE_LABEL = " \u25B8\u25B8\u25B8 More \u21B4"
 
@@ -53,7 +57,7 @@ class TableUtilMixin:
         return text
 
 
-class TableDivider(npyscreen.wgwidget.Widget, TableUtilMixin):
+class TableDivider(DamageMixin, npyscreen.wgwidget.Widget, TableUtilMixin):
     """
     Vertical table divider.
     """
@@ -89,7 +93,7 @@ class TableDivider(npyscreen.wgwidget.Widget, TableUtilMixin):
                           self.relx, div, self.make_attributes_list(div, color), 1)
 
 
-class TableHeader(npyscreen.wgwidget.Widget, TableUtilMixin):
+class TableHeader(DamageMixin, npyscreen.wgwidget.Widget, TableUtilMixin):
     """
     Table header.
     """
@@ -107,17 +111,47 @@ class TableHeader(npyscreen.wgwidget.Widget, TableUtilMixin):
         self._columns = len(self._headers)
         self._min_width = (len(self._headers) * 6) + (len(self._headers) - 2)
         self._color = color
+        self._title = None
+        self._lines = None  # Formatted lines, valid for the width and the title
+        self.set_title(title)
+
+    def set_title(self, title) -> None:
+        """
+        Set title of the table.
+
+        :param title: text of the title, None for no title
+        :return: None
+        """
         if title:
             self._title = " {} ".format(title)
         else:
             self._title = None
 
+    def get_damage_state(self) -> tuple:
+        return super(TableHeader, self).get_damage_state() + (self._title,)
+
     def update(self, clear=True):
         if clear: self.clear()
         if self.hidden:
             self.clear()
             return False
 
+        header, bar, title = self._get_lines()
+        self.add_line(self.rely + 1, self.relx, *header, self.width - 1)
+        self.add_line(self.rely, self.relx, *bar, self.width)
+        if title:
+            self.add_line(self.rely, self.relx + 1, *title, self.width)
+
+    def _get_lines(self) -> tuple:
+        """
+        Get formatted lines of the header with their attributes.
+        They are formatted again only after resize or change of the title.
+
+        :return: tuple of (text, attributes) of the header, the bar and the title (None without the title)
+        """
+        if self._lines is not None and self._lines[0] == (self.width, self._title):
+            return self._lines[1]
+
         name = []
         for idx, header in enumerate(self._headers):
             name.append(self._fit_text_in_cell(header))
@@ -126,33 +160,475 @@ class TableHeader(npyscreen.wgwidget.Widget, TableUtilMixin):
         name.append(" ")
         name = "".join(name).strip().ljust(self.width - 1).rjust(self.width)
         color = curses.color_pair(5)  # Already curses-initialised pair. 0-9 normal, 10-20 are bold
-        self.add_line(self.rely + 1, self.relx, name,
-                      self.make_attributes_list(name, curses.A_REVERSE | curses.A_NORMAL | color), self.width - 1)
+        header = name, self.make_attributes_list(name, curses.A_REVERSE | curses.A_NORMAL | color)
 
         name = self.C_BF_SX_DOWN * (self.width - 1)
-        self.add_line(self.rely, self.relx, name, self.make_attributes_list(name, color), self.width)
+        bar = name, self.make_attributes_list(name, color)
 
-        # Title
+        title = None
         if self._title:
-            self.add_line(self.rely, self.relx + 1, self._title,
-                          self.make_attributes_list(self._title, curses.color_pair(5) | curses.A_BOLD), self.width)
+            title = self._title, self.make_attributes_list(self._title, curses.color_pair(5) | curses.A_BOLD)
+
+        self._lines = (self.width, self._title), (header, bar, title)
+
+        return self._lines[1]
 
 
-class Table(npyscreen.MultiLineAction, TableUtilMixin):
+class RowProvider:
+    """
+    Rows of the virtualized table.
+
+    Table requests only the rows it displays, by one range per frame.
+    Subclasses override "__len__" and "get_range", and call "changed"
+    after the rows are changed, so the table repaints them.
+    """
+    columns = 0  # Number of the columns, 0 finds it out from the displayed rows
+
+    def __init__(self):
+        self.version = 0
+        self.data_version = 0  # Changed with the rows, but not with their order
+
+    def changed(self, data=True) -> None:
+        """
+        Mark rows as changed.
+
+        :param data: rows are changed, not only their order
+        :return: None
+        """
+        self.version += 1
+        if data:
+            self.data_version += 1
+
+    def __len__(self):
+        raise NotImplementedError("This method should be overridden")
+
+    def get_range(self, start, stop) -> list:
+        """
+        Get rows in the range.
+
+        :param start: index of the first row
+        :param stop: index after the last row
+        :return: list of rows, shorter at the end
+        """
+        raise NotImplementedError("This method should be overridden")
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        rows = self.get_range(index, index + 1) if index >= 0 else []
+        if not rows:
+            raise IndexError("Row index out of range")
+
+        return rows[0]
+
+
+class Table(DamageMixin, npyscreen.MultiLineAction, TableUtilMixin):
     """
     Table view.
+
+    Rows are either a list, or a RowProvider for the virtualized table.
+    Either way, the cost of the update depends only on the number of the visible rows:
+    instead of the copies of all the values, kept by npyscreen to find out changes,
+    the table counts versions of its data. Rows, updated by their keys (see "upsert"),
+    repaint only their own lines.
     """
-    def __init__(self, *args, highlight_map=None, **keywords):
+    FORMATTED_ROWS = 256  # Minimum of the formatted rows in the cache
+    FILTER_CHUNK = 4096  # Rows of the provider, requested at once to index them for the filter
+
+    def __init__(self, *args, highlight_map=None, row_key=None, **keywords):
+        """
+        :param highlight_map: highlight map of the lines, see ColoredTextField
+        :param row_key: callable, accepting the row and returning its unique key, for "upsert" of the list rows.
+                        RowProvider has its own keys.
+        """
         self.cell_highlight_map = highlight_map or {}
+        self._row_key = row_key
+        self._key_index = None  # Version of the rows and their positions by the keys
         self._columns = 0
+        self._values = []
+        self._version = 0  # Changed by the table itself, provider has its own version
+        self._window_start, self._window = 0, []  # Displayed rows of the provider
+        self._last_state = None
+        self._painted = None  # Cursor offset, "more" label, cursor shown and the rows of the painted lines
+        self._filtered_version = None
+        self._filter_index, self._filter_index_version = None, None
+        self._formatted = collections.OrderedDict()  # Row (or its ID) to (row, text), see "display_value"
+        self._formatted_layout = None
         super(Table, self).__init__(*args, **keywords)
         self.values = []
         self.add_handlers({
             "^V": self.on_add_record,
+            "s": self.h_sort,
+            "S": self.h_sort_reverse,
             curses.KEY_ENTER: self.on_view_record,
             10: self.on_view_record,
         })
         self.__on_select_callbacks = []
+        self.__on_more_callbacks = []
+
+    @property
+    def values(self):
+        """
+        Rows of the table.
+
+        :return: list or RowProvider
+        """
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = [] if values is None else values
+        self._version += 1
+
+    def _get_version(self) -> tuple:
+        """
+        Get version of the rows.
+
+        :return: tuple
+        """
+        return self._version, getattr(self._values, "version", None)
+
+    def _get_data_version(self) -> tuple:
+        """
+        Get version of the rows, not changed if only the order of the provider rows is changed.
+
+        :return: tuple
+        """
+        return self._version, getattr(self._values, "data_version", None)
+
+    def reset_display_cache(self):
+        self._last_state = None
+        self._painted = None
+        self._last_value = False
+
+    def get_damage_state(self) -> tuple:
+        """
+        Get displayed state of the table: the rows version, the scroll and the filter.
+
+        :return: tuple
+        """
+        return super(Table, self).get_damage_state() + (
+            self._get_version(), self.start_display_at, self.cursor_line, self._filter)
+
+    def _fetch_window(self, start, count) -> None:
+        """
+        Fetch the displayed rows of the provider by one request.
+
+        :param start: index of the first displayed row
+        :param count: number of the displayed rows
+        :return: None
+        """
+        if isinstance(self._values, RowProvider):
+            self._window_start, self._window = start, self._values.get_range(start, start + count)
+            if not self._values.columns:
+                for row in self._window:
+                    if len(row) > self._columns:
+                        self._columns = len(row)
+        else:
+            self._window_start, self._window = 0, self._values
+
+    def _get_window_rows(self, count) -> list:
+        """
+        Get displayed rows of the fetched window.
+
+        :param count: number of the displayed rows
+        :return: list of rows, shorter at the end
+        """
+        start = self.start_display_at - self._window_start
+        return self._window[start:start + count]
+
+    def _set_line_values(self, line, value_indexer):
+        try:
+            row = self._window[value_indexer - self._window_start]
+        except (IndexError, TypeError):
+            self._set_line_blank(line)
+            return False
+        line.value = self.display_value(row)
+        line.hidden = False
+
+    def get_filtered_indexes(self, force_remake_cache=False):
+        version = self._get_version()
+        if not force_remake_cache and self._last_filter == self._filter and self._filtered_version == version:
+            return self._filtered_values_cache
+
+        self._last_filter = self._filter
+        self._filtered_version = version
+        if not self._filter:
+            return []
+
+        return self._get_positions(self._get_filter_index().find(self._filter))
+
+    def _has_row_keys(self) -> bool:
+        """
+        Rows have keys: the list rows by the "row_key", the provider rows by the provider.
+
+        :return: bool
+        """
+        if isinstance(self._values, RowProvider):
+            return getattr(self._values, "has_keys", lambda: False)()
+        return self._row_key is not None
+
+    def _get_positions(self, keys) -> array.array:
+        """
+        Get positions of the rows.
+
+        :param keys: row keys, or the positions themselves, if the rows have no keys
+        :return: array of the positions, sorted
+        """
+        if not self._has_row_keys():
+            positions = keys
+        elif isinstance(self._values, RowProvider):
+            positions = self._values.find_all(keys)
+        else:
+            index = self._get_key_index()
+            positions = [index[key] for key in keys if key in index]
+
+        return array.array("l", sorted(positions))
+
+    def _get_filter_index(self) -> FilterIndex:
+        """
+        Get matches of the filter queries by the row keys (by the positions, if the rows have no keys).
+        It is updated per row by "upsert", "update_row" and "add_data", and made again
+        only if the rows are changed otherwise. Sorting the provider rows does not change it.
+
+        :return: FilterIndex
+        """
+        version = self._get_data_version()
+        if self._filter_index is None or self._filter_index_version != version:
+            keyed = self._has_row_keys()
+            if isinstance(self._values, RowProvider) and keyed:
+                rows = self._values.iter_rows(self.FILTER_CHUNK)
+            elif isinstance(self._values, RowProvider):
+                rows = ((position, row) for start in range(0, len(self._values), self.FILTER_CHUNK)
+                        for position, row in enumerate(self._values.get_range(start, start + self.FILTER_CHUNK),
+                                                       start))
+            else:
+                rows = ((self._row_key(row) if keyed else position, row) for position, row in enumerate(self._values))
+            self._filter_index = FilterIndex((key, self._get_row_text(row)) for key, row in rows)
+            self._filter_index_version = version
+
+        return self._filter_index
+
+    def _update_filter_index(self, version, rows=(), removed=()) -> None:
+        """
+        Update the filter matches of the changed rows, if they were up to date before the change.
+
+        :param version: data version before the change
+        :param rows: iterable of (row key, row) of the changed and the added rows
+        :param removed: iterable of the keys of the removed rows
+        :return: None
+        """
+        if self._filter_index is None or self._filter_index_version != version:
+            return
+        for key in removed:
+            self._filter_index.remove(key)
+        for key, row in rows:
+            self._filter_index.set_text(key, self._get_row_text(row))
+        self._filter_index_version = self._get_data_version()
+        self._filtered_version = None  # Positions of the matches are found again
+
+    def _set_line_highlighting(self, line, value_indexer):
+        # Filtered indexes are sorted, so they are bisected instead of the list lookup per line
+        self.set_is_line_important(line, FilterIndex.contains(self._filtered_values_cache, value_indexer))
+        self.set_is_line_bold(line, self.value is not None and value_indexer == self.value)
+        self.set_is_line_cursor(line, False)
+
+    def move_next_filtered(self, include_this_line=False, *args):
+        """
+        Move cursor to the next filtered row.
+
+        :param include_this_line: stay on the current row, if it is filtered
+        :return:
+        """
+        if not self._filter:
+            return False
+        position = FilterIndex.get_next(self._filtered_values_cache, self.cursor_line, include=include_this_line)
+        if position is not None:
+            self.cursor_line = position
+        self.update()
+
+    def move_previous_filtered(self, *args):
+        """
+        Move cursor to the previous filtered row.
+
+        :return:
+        """
+        if not self._filter:
+            return False
+        position = FilterIndex.get_previous(self._filtered_values_cache, self.cursor_line)
+        if position is not None:
+            self.cursor_line = position
+            return True
+
+    def update(self, clear=True):
+        """
+        Repaint the table, if anything displayed has changed.
+        This follows MultiLine.update, but finds out changes by the versions of the rows.
+
+        :param clear: clear the widget before repainting. None clears it only on scrolling.
+        :return:
+        """
+        if self.hidden:
+            if clear:
+                self.clear()
+            return False
+
+        display_length = len(self._my_widgets)
+        self._filtered_values_cache = self.get_filtered_indexes()
+        count = len(self._values)
+
+        if self.editing or self.always_show_cursor:
+            self.cursor_line = max(0, min(self.cursor_line, count - 1))
+            if self.slow_scroll:
+                if self.cursor_line > self.start_display_at + display_length - 1:
+                    self.start_display_at = self.cursor_line - (display_length - 1)
+                if self.cursor_line < self.start_display_at:
+                    self.start_display_at = self.cursor_line
+            else:
+                if self.cursor_line > self.start_display_at + (display_length - 2):
+                    self.start_display_at = self.cursor_line
+                if self.cursor_line < self.start_display_at:
+                    self.start_display_at = max(0, self.cursor_line - (display_length - 2))
+
+        state = (self._get_version(), self.value, self.start_display_at, self.cursor_line, self._filter)
+        if clear or self.never_cache or not self.editing or state != self._last_state:
+            if clear is True:
+                self.clear()
+            elif clear is None and self._last_start_display_at != self.start_display_at:
+                self.clear()
+            self._last_start_display_at = self.start_display_at
+
+            self._before_print_lines()
+            self._fetch_window(self.start_display_at, display_length)
+            indexer = self.start_display_at
+            for line in self._my_widgets[:-1]:
+                self._print_line(line, indexer)
+                line.task = "PRINTLINE"
+                line.update(clear=True)
+                indexer += 1
+
+            line = self._my_widgets[-1]
+            more = count > indexer + 1
+            if not more:
+                self._print_line(line, indexer)
+                line.task = "PRINTLINE"
+                line.update(clear=False)
+            else:
+                more_label = npyscreen.wgmultiline.MORE_LABEL
+                line.name = more_label
+                line.task = more_label
+                line.clear()
+                if self.do_colors():
+                    self.parent.curses_pad.addstr(self.rely + self.height - 1, self.relx, more_label,
+                                                  self.parent.theme_manager.findPair(self, "CONTROL"))
+                else:
+                    self.parent.curses_pad.addstr(self.rely + self.height - 1, self.relx, more_label)
+
+            if self.editing or self.always_show_cursor:
+                self.set_is_line_cursor(self._my_widgets[self.cursor_line - self.start_display_at], True)
+                self._my_widgets[self.cursor_line - self.start_display_at].update(clear=True)
+            else:
+                self._my_widgets[0].update()  # See MultiLine.update: the first line inherits the color otherwise
+            self._painted = (self.cursor_line - self.start_display_at, more, self.editing or self.always_show_cursor,
+                             self._get_window_rows(display_length - more))
+
+        self._last_start_display_at = self.start_display_at
+        self._last_cursor_line = self.cursor_line
+        self._last_value = self.value
+        self._last_state = state
+
+        # Cursor is on the "more" label, e.g. rows were removed: scroll
+        if self._my_widgets[self.cursor_line - self.start_display_at].task == npyscreen.wgmultiline.MORE_LABEL:
+            if self.slow_scroll:
+                self.start_display_at += 1
+            else:
+                self.start_display_at = self.cursor_line
+            self.update(clear=clear)
+
+    def add_on_more_callback(self, callback):
+        """
+        Add callback, called when cursor reaches the last loaded row.
+        This is where more rows can be loaded, e.g. next page of a collection.
+
+        :param callback: callable without arguments
+        :return:
+        """
+        self.__on_more_callbacks.append(callback)
+
+    def _check_more(self):
+        """
+        Call "more" callbacks, if cursor is at the last row.
+
+        :return:
+        """
+        if self.cursor_line >= len(self.values) - 1:
+            for callback in self.__on_more_callbacks:
+                callback()
+
+    def h_cursor_line_down(self, ch):
+        super(Table, self).h_cursor_line_down(ch)
+        self._check_more()
+
+    def h_cursor_page_down(self, ch):
+        super(Table, self).h_cursor_page_down(ch)
+        self._check_more()
+
+    def h_cursor_end(self, ch):
+        super(Table, self).h_cursor_end(ch)
+        self._check_more()
+
+    def h_sort(self, ch):
+        """
+        Sort by the next column, then by the previous sort keys.
+        Rows must be sortable, e.g. TableModel.
+
+        :return:
+        """
+        if getattr(self.values, "sort_by", None) is None or not self._columns:
+            curses.beep()
+            return
+        sort = self.values.get_sort()
+        self._sort((sort[0][0] + 1) % self._columns if sort else 0, False)
+
+    def h_sort_reverse(self, ch):
+        """
+        Reverse order of the primary sort key.
+
+        :return:
+        """
+        if getattr(self.values, "sort_by", None) is None or not self._columns:
+            curses.beep()
+            return
+        sort = self.values.get_sort()
+        column, reverse = sort[0] if sort else (0, False)
+        self._sort(column, not reverse)
+
+    def _sort(self, column, reverse) -> None:
+        """
+        Sort rows, keeping the cursor on the same row.
+
+        :param column: column index
+        :param reverse: descending order
+        :return: None
+        """
+        index = self.values.get_index(self.cursor_line) if len(self.values) else None
+        future = self.values.sort_by(column, reverse=reverse)
+        if future.done():
+            self._on_sorted(index)
+        elif getattr(self.parent, "post", None) is not None:
+            # Large tables are sorted in the background
+            future.add_done_callback(lambda ftr: self.parent.post(self._on_sorted, index))
+
+    def _on_sorted(self, index) -> None:
+        """
+        Display sorted rows.
+
+        :param index: storage index of the row under the cursor before sorting
+        :return: None
+        """
+        if index is not None and index < len(self.values):
+            self.cursor_line = self.values.get_position(index)
+        self.display()
 
     def add_on_select_callback(self, callback):
         """
@@ -187,16 +663,237 @@ class Table(npyscreen.MultiLineAction, TableUtilMixin):
         Load data if arbitrary objects.
 
         Each object will be either displayed by ".title" attribute
-        or __str__ conversion.
+        or __str__ conversion. RowProvider is displayed virtualized:
+        only its visible rows are requested.
+
+        :param objects: Objects or RowProvider.
+        :return: None
+        """
+        if isinstance(objects, RowProvider):
+            self._columns = objects.columns
+            self.values = objects
+        else:
+            self.values = []
+            self.add_data(objects)
+
+    def add_data(self, objects) -> None:
+        """
+        Add more arbitrary objects after already loaded data.
 
         :param objects: Objects.
         :return: None
         """
-        self.values = []
+        if isinstance(self._values, RowProvider):
+            raise TypeError("Rows of the virtualized table are added to its provider")
+
+        version, start = self._get_data_version(), len(self._values)
         for values in objects:
             if len(values) > self._columns:
                 self._columns = len(values)
-            self.values.append(values)
+            self._values.append(values)
+        self._version += 1
+        added = enumerate(self._values[start:], start)
+        self._update_filter_index(version, ((self._row_key(row) if self._row_key is not None else position, row)
+                                            for position, row in added))
+
+    def update_row(self, index, values) -> None:
+        """
+        Replace one row and repaint only its line, if it is visible.
+
+        :param index: index of the row
+        :param values: objects of the row
+        :return: None
+        """
+        if isinstance(self._values, RowProvider):
+            raise TypeError("Rows of the virtualized table are updated in its provider")
+
+        # Version is not changed, as the line is repainted right here
+        previous, self._values[index] = self._values[index], values
+        self._formatted.pop(self._get_formatted_key(previous), None)
+        if self._row_key is None:
+            self._update_filter_index(self._get_data_version(), [(index, values)])
+        else:
+            removed = [self._row_key(previous)] if self._row_key(previous) != self._row_key(values) else []
+            self._update_filter_index(self._get_data_version(), [(self._row_key(values), values)], removed)
+            if removed:
+                self._key_index = None
+        if self._filter:
+            self._filtered_values_cache = self.get_filtered_indexes()
+        line = index - self.start_display_at
+        if 0 <= line < len(self._my_widgets) - 1:  # Last line might be "more" label
+            widget = self._my_widgets[line]
+            self._print_line(widget, index)
+            self.set_is_line_cursor(widget, (self.editing or self.always_show_cursor) and index == self.cursor_line)
+            widget.update()
+            if self._painted is not None and line < len(self._painted[3]):
+                self._painted[3][line] = values
+
+    def upsert(self, rows, removed=()) -> None:
+        """
+        Replace rows with the same keys, add the others and remove rows by the keys.
+        Cursor and selection stay on their rows, and only the lines of the changed rows are repainted.
+
+        Rows are keyed by "row_key" of the table, or by the keys of the RowProvider (e.g. TableModel).
+
+        :param rows: iterable of rows
+        :param removed: iterable of the keys of the rows to remove
+        :return: None
+        """
+        cursor_key, value_key = self._get_row_key(self.cursor_line), self._get_row_key(self.value)
+        rows, removed = list(rows), list(removed)
+        provider = isinstance(self._values, RowProvider)
+        keys = [self._values.get_row_key(row) if provider else self._row_key(row) for row in rows]
+        self._forget_formatted(keys + removed)
+        version = self._get_data_version()
+        if provider:
+            future = self._values.upsert(rows, removed)
+            if self._get_data_version()[1] == version[1] + 1:  # Changed only by this upsert
+                self._update_filter_index(version, self._values.get_rows(keys), removed)
+        else:
+            future = None
+            self._upsert(rows, removed)
+            self._update_filter_index(version, zip(keys, rows), removed)
+
+        self._on_rows_changed(cursor_key, value_key)
+        if future is not None and getattr(self.parent, "post", None) is not None:
+            # Large tables are sorted in the background, so the rows are moving after that once again.
+            # The sort may be already finished, then the callback is called right away.
+            future.add_done_callback(lambda ftr: self.parent.post(self._on_rows_changed, cursor_key, value_key))
+
+    def remove(self, keys) -> None:
+        """
+        Remove rows by the keys. See "upsert".
+
+        :param keys: iterable of the keys of the rows
+        :return: None
+        """
+        self.upsert((), keys)
+
+    def _upsert(self, rows, removed) -> None:
+        """
+        Update the list rows by the keys.
+
+        :param rows: iterable of rows
+        :param removed: iterable of the keys of the rows to remove
+        :return: None
+        """
+        index = self._get_key_index()
+        changed = False
+        for row in rows:
+            key = self._row_key(row)
+            position = index.get(key)
+            if position is None:
+                index[key] = len(self._values)
+                self._values.append(row)
+                if len(row) > self._columns:
+                    self._columns = len(row)
+            else:
+                self._values[position] = row
+            changed = True
+
+        removed = {index[key] for key in removed if key in index}
+        if removed:
+            self._values[:] = [row for position, row in enumerate(self._values) if position not in removed]
+        if changed or removed:
+            self._version += 1
+            self._key_index = None if removed else (self._version, index)
+
+    def _get_key_index(self) -> dict:
+        """
+        Get positions of the list rows by their keys. It is made again after the rows are changed.
+
+        :return: dict
+        """
+        if self._row_key is None:
+            raise TypeError("Rows of the table without the row key have no keys")
+        if self._key_index is None or self._key_index[0] != self._version:
+            self._key_index = self._version, {self._row_key(row): position for position, row in enumerate(self._values)}
+
+        return self._key_index[1]
+
+    def _get_row_key(self, position):
+        """
+        Get key of the row.
+
+        :param position: position of the row
+        :return: key, None if there is no such row or the rows have no keys
+        """
+        if not isinstance(position, int) or not 0 <= position < len(self._values):
+            return None
+        if isinstance(self._values, RowProvider):
+            return self._values.get_key(position) if hasattr(self._values, "get_key") else None
+
+        return self._row_key(self._values[position]) if self._row_key is not None else None
+
+    def _find_row(self, key):
+        """
+        Find the row by its key.
+
+        :param key: key of the row
+        :return: position of the row, None if there is no such row
+        """
+        if isinstance(self._values, RowProvider):
+            return self._values.find(key)
+
+        return self._get_key_index().get(key)
+
+    def _on_rows_changed(self, cursor_key, value_key) -> None:
+        """
+        Keep cursor and selection on their rows after the rows are changed, and repaint the changed lines.
+        Display is scrolled along with the cursor, so the unchanged lines are not moving.
+
+        :param cursor_key: key of the row under the cursor before the change
+        :param value_key: key of the selected row before the change
+        :return: None
+        """
+        if cursor_key is not None:
+            position = self._find_row(cursor_key)
+            if position is not None:
+                self.start_display_at = max(0, self.start_display_at + position - self.cursor_line)
+                self.cursor_line = position
+        self.cursor_line = max(0, min(self.cursor_line, len(self._values) - 1))
+        if value_key is not None:
+            self.value = self._find_row(value_key)
+        self._repaint_changed()
+
+    def _repaint_changed(self) -> None:
+        """
+        Repaint only the lines, which rows are changed since they were painted.
+        The whole table is repainted, if anything else is changed, e.g. the filtered lines.
+
+        :return: None
+        """
+        if self.hidden:
+            return
+
+        display_length = len(self._my_widgets)
+        more = len(self._values) > self.start_display_at + display_length
+        cursor = self.editing or self.always_show_cursor
+        offset = self.cursor_line - self.start_display_at
+        if self._painted is None or self._filter or self._painted[:3] != (offset, more, cursor) \
+                or not 0 <= offset < display_length - more:
+            self.update(clear=False)
+            return
+
+        self._filtered_values_cache = self.get_filtered_indexes()
+        self._fetch_window(self.start_display_at, display_length)
+        rows, painted = self._get_window_rows(display_length - more), self._painted[3]
+        for line in range(display_length - more):
+            row = rows[line] if line < len(rows) else None
+            if row != (painted[line] if line < len(painted) else None):
+                widget = self._my_widgets[line]
+                self._print_line(widget, self.start_display_at + line)
+                widget.task = "PRINTLINE"
+                self.set_is_line_cursor(widget, cursor and line == offset)
+                widget.update(clear=True)
+
+        self._painted = offset, more, cursor, rows
+        self._last_state = (self._get_version(), self.value, self.start_display_at, self.cursor_line, self._filter)
+        self._last_start_display_at = self.start_display_at
+        self._last_cursor_line = self.cursor_line
+        self._last_value = self.value
+        if not self.damaged and self._painted_state is not None:
+            self.painted()  # Changed lines are repainted already, the frame has nothing left to repaint
 
     def on_view_record(self, *args, **kwargs):
         """
@@ -212,9 +909,87 @@ class Table(npyscreen.MultiLineAction, TableUtilMixin):
         """
         Display value formatter.
 
+        Rows are formatted once and then taken from the cache, while they are displayed.
+        Rows are cached by their values (by their identity, if the values are not hashable),
+        so only the changed rows are formatted again, however the other rows are sorted or moved.
+        Rows, replaced or removed by "upsert" and "update_row", are dropped from the cache,
+        and the whole cache only on the change of the layout (resize or more columns).
+        Rows are treated as immutable: replace the row (e.g. "update_row") to display its changes.
+
         :param row_data: a list of objects in the cell.
         :return:
         """
+        layout = self.width, self.max_width, self._columns
+        if layout != self._formatted_layout:
+            self._formatted.clear()
+            self._formatted_layout = layout
+
+        # Entry keeps the row, so its ID can't be reused by another row while it is cached
+        key = self._get_formatted_key(row_data)
+        entry = self._formatted.get(key)
+        if entry is not None and (entry[0] is row_data or entry[0] == row_data):
+            self._formatted.move_to_end(key)
+            return entry[1]
+
+        text = self._format_row(row_data)
+        self._formatted[key] = row_data, text
+        if len(self._formatted) > max(self.FORMATTED_ROWS, len(self._my_widgets) * 4):
+            self._formatted.popitem(last=False)
+
+        return text
+
+    @staticmethod
+    def _get_formatted_key(row_data):
+        """
+        Get key of the row in the cache of the formatted rows.
+
+        :param row_data: a list of objects in the cell.
+        :return: the row itself, or its ID if it is not hashable
+        """
+        try:
+            hash(row_data)
+        except TypeError:
+            return id(row_data)
+        return row_data
+
+    def _forget_formatted(self, keys) -> None:
+        """
+        Drop the formatted rows from the cache, before they are replaced or removed.
+
+        :param keys: iterable of the row keys
+        :return: None
+        """
+        if not self._formatted:
+            return
+        if isinstance(self._values, RowProvider):
+            rows = [row for _, row in self._values.get_rows(keys)]
+        else:
+            index = self._get_key_index()
+            rows = [self._values[index[key]] for key in keys if key in index]
+        for row in rows:
+            self._formatted.pop(self._get_formatted_key(row), None)
+
+    def filter_value(self, index):
+        return self._filter in self._get_row_text(self.values[index])
+
+    def _get_row_text(self, row_data) -> str:
+        """
+        Get text of the row to filter it: the complete cell values, not truncated to the cells.
+
+        :param row_data: a list of objects in the cell.
+        :return: text
+        """
+        if not self._columns:
+            return str(row_data)
+        return self.C_LVT_FULL.join(obj.value if hasattr(obj, "value") else str(obj) for obj in row_data)
+
+    def _format_row(self, row_data) -> str:
+        """
+        Format the row into the line of the table.
+
+        :param row_data: a list of objects in the cell.
+        :return: text of the line
+        """
         if self._columns:
             cell = []
             for obj in row_data:
@@ -0,0 +1,140 @@
+# coding: utf-8
+"""
+Incremental filter of the table rows.
+
+Rows, matching the query, contain each substring of it as well. So the matches
+of the recent queries are kept, and the next query is checked only against
+the matches of its smallest known substring: typing narrows the previous matches,
+deleting finds them right away. Matches are kept by the row keys, not by the
+positions, and changed rows are checked against each kept query, so sorting
+or changing the rows does not make them again.
+"""
+import bisect
+import collections
+
+
+class FilterIndex:
+    """
+    Matches of the recent queries over the row texts, updated per changed row.
+
+    This is not an n-gram index: only the queries, which were looked up, are kept.
+    Rows are identified by their keys (any hashable, e.g. the row key or the position
+    of the rows, which never move).
+    """
+    QUERIES = 64  # Maximum of the kept queries
+    MAX_SUBQUERY = 32  # Longest substring of the query to look up in the kept queries
+
+    def __init__(self, texts):
+        """
+        :param texts: dict of the row key to the row text, or iterable of (row key, row text)
+        """
+        self._texts = dict(texts)
+        self._matches = collections.OrderedDict()  # Query to the set of the matching row keys
+
+    def __len__(self):
+        return len(self._texts)
+
+    def find(self, query) -> set:
+        """
+        Find rows, containing the query.
+
+        :param query: text to find
+        :return: set of the row keys. Do not modify it.
+        """
+        if not query:
+            return set()
+
+        matches = self._matches.get(query)
+        if matches is not None:
+            self._matches.move_to_end(query)
+            return matches
+
+        texts = self._texts
+        candidates = self._get_candidates(query)
+        if candidates is None:
+            matches = {key for key, text in texts.items() if query in text}
+        else:
+            matches = {key for key in candidates if query in texts[key]}
+        self._matches[query] = matches
+        if len(self._matches) > self.QUERIES:
+            self._matches.popitem(last=False)
+
+        return matches
+
+    def _get_candidates(self, query):
+        """
+        Get the smallest matches of the kept substrings of the query.
+
+        :param query: text to find
+        :return: set of the row keys, None if no substring is kept
+        """
+        candidates = None
+        for size in range(min(len(query) - 1, self.MAX_SUBQUERY), 0, -1):
+            for start in range(len(query) - size + 1):
+                matches = self._matches.get(query[start:start + size])
+                if matches is not None and (candidates is None or len(matches) < len(candidates)):
+                    candidates = matches
+        return candidates
+
+    def set_text(self, key, text) -> None:
+        """
+        Add the row or replace its text, updating the matches of the kept queries.
+
+        :param key: row key
+        :param text: text of the row
+        :return: None
+        """
+        self._texts[key] = text
+        for query, matches in self._matches.items():
+            if query in text:
+                matches.add(key)
+            else:
+                matches.discard(key)
+
+    def remove(self, key) -> None:
+        """
+        Remove the row.
+
+        :param key: row key
+        :return: None
+        """
+        if self._texts.pop(key, None) is not None:
+            for matches in self._matches.values():
+                matches.discard(key)
+
+    @staticmethod
+    def contains(matches, position) -> bool:
+        """
+        Check if the row is in the matches.
+
+        :param matches: sorted row positions
+        :param position: row position
+        :return: bool
+        """
+        idx = bisect.bisect_left(matches, position)
+        return idx < len(matches) and matches[idx] == position
+
+    @staticmethod
+    def get_next(matches, position, include=False):
+        """
+        Get the next match after the row.
+
+        :param matches: sorted row positions
+        :param position: row position
+        :param include: the row itself is the next match, if it matches
+        :return: row position, None if there are no more matches
+        """
+        idx = (bisect.bisect_left if include else bisect.bisect_right)(matches, position)
+        return matches[idx] if idx < len(matches) else None
+
+    @staticmethod
+    def get_previous(matches, position):
+        """
+        Get the previous match before the row.
+
+        :param matches: sorted row positions
+        :param position: row position
+        :return: row position, None if there are no more matches
+        """
+        idx = bisect.bisect_left(matches, position)
+        return matches[idx - 1] if idx else None
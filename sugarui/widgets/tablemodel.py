@@ -0,0 +1,610 @@
+# coding: utf-8
+"""
+Column-oriented table model.
+
+Values are stored by columns: a typed array for the columns with the typecode,
+otherwise a list. Sorting does not move the values, but computes the permutation
+of the row indexes, using the sort keys cached per column.
+"""
+import array
+import bisect
+import threading
+import collections
+import concurrent.futures
+
+from sugarui.widgets.table import RowProvider
+
+
+class Column:
+    """
+    Column of the table model.
+    """
+    def __init__(self, name, typecode=None, key=None, display=None):
+        """
+        :param name: name of the column
+        :param typecode: typecode of the array to store the values (see "array"), None stores them in a list
+        :param key: callable, accepting the value and returning its sort key.
+                    Default is the value itself for the typed columns, otherwise its lowercase text.
+        :param display: callable, accepting the value and returning the object to display. Default is the value.
+        """
+        self.name = name
+        self.typecode = typecode
+        self.key = key or (None if typecode else self.get_text_key)
+        self.display = display
+
+    @staticmethod
+    def get_text_key(value) -> str:
+        """
+        Get case-insensitive text key of the value.
+
+        :param value: value
+        :return: str
+        """
+        return str(value).lower()
+
+    def make_storage(self, values=()):
+        """
+        Make storage of the column values.
+
+        :param values: iterable of the values
+        :return: array or list
+        """
+        return array.array(self.typecode, values) if self.typecode else list(values)
+
+
+class TableModel(RowProvider):
+    """
+    Column-oriented rows of the virtualized table, sortable by multiple keys.
+
+    Rows are stored in the order they are added, so their storage indexes are
+    stable until rows are removed. Table displays them in the sort order.
+    Sorting of more than SORT_THRESHOLD rows runs in the background thread,
+    the previous order is displayed meanwhile. Rows, changed while sorting,
+    are merged into the finished order, so steady updates never hold it back.
+    With the key function, rows are also updated by their keys (see "upsert").
+    """
+    SORT_THRESHOLD = 20000
+    SORT_KEYS = 3  # Maximum of the keys to sort by
+
+    _sorter = None  # Background sorting thread, shared by all the models
+
+    def __init__(self, columns, key=None):
+        """
+        :param columns: list of Column
+        :param key: callable, accepting the row tuple of the stored values and returning its unique key
+        """
+        RowProvider.__init__(self)
+        self._spec = list(columns)
+        self.columns = len(self._spec)
+        self._data = [column.make_storage() for column in self._spec]
+        self._keys = [None] * self.columns  # Cached sort keys per column, None if not computed yet
+        self._sort = []  # List of (column index, reverse), primary key first
+        self._order = None  # Permutation: storage indexes in the display order. None is the storage order.
+        self._positions = None  # Inverse permutation: display positions by the storage indexes
+        self._rows = {}  # Storage index to the row tuple, while the data is not changed
+        self._sorting = None
+        self._changed_rows = None  # Storage indexes, changed while sorting in the background. None if not tracked.
+        self._removed_rows = None  # Lists of the storage indexes, removed while sorting in the background
+        self._key = key
+        self._index = None  # Key to the storage index, made on demand
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data[0]) if self._data else 0
+
+    def get_names(self) -> list:
+        """
+        Get names of the columns.
+
+        :return: list of str
+        """
+        return [column.name for column in self._spec]
+
+    def get_column(self, column):
+        """
+        Get values of the column in the storage order. Do not modify it.
+
+        :param column: column index
+        :return: array or list
+        """
+        return self._data[column]
+
+    def get_index(self, position) -> int:
+        """
+        Get storage index of the row, displayed at the position.
+
+        :param position: display position of the row
+        :return: storage index
+        """
+        order = self._order
+        # Rows, added after the last sorting, are displayed at the end in the storage order
+        return order[position] if order is not None and position < len(order) else position
+
+    def get_position(self, index) -> int:
+        """
+        Get display position of the row.
+
+        :param index: storage index of the row
+        :return: display position
+        """
+        with self._lock:
+            order = self._order
+            if order is None or index >= len(order):
+                return index
+            return self._positions[index]
+
+    def _get_row(self, index) -> tuple:
+        """
+        Get row tuple. The same row is the same object, while it is not changed,
+        so the table is not formatting it again.
+
+        :param index: storage index
+        :return: tuple
+        """
+        row = self._rows.get(index)
+        if row is None:
+            row = self._rows[index] = self._make_row(index)
+        return row
+
+    def _make_row(self, index) -> tuple:
+        """
+        Make row tuple of the displayed values.
+
+        :param index: storage index
+        :return: tuple
+        """
+        return tuple(values[index] if column.display is None else column.display(values[index])
+                     for column, values in zip(self._spec, self._data))
+
+    def get_range(self, start, stop) -> list:
+        with self._lock:
+            stop = min(stop, len(self))
+            if len(self._rows) > max(0x400, (stop - start) * 4):
+                self._rows.clear()
+            return [self._get_row(self.get_index(position)) for position in range(start, stop)]
+
+    def _changed(self):
+        """
+        Data is changed: drop the rows and sort again, if sorted.
+
+        :return: Future of the sorting, None if not sorted
+        """
+        self._rows.clear()
+        self.changed()
+        return self._resort() if self._sort else None
+
+    def extend(self, rows) -> None:
+        """
+        Add rows.
+
+        :param rows: iterable of the row tuples
+        :return: None
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._extend(rows)
+            self._changed()
+
+    def _extend(self, rows) -> None:
+        """
+        Add rows. Must be called under the lock.
+
+        :param rows: list of the row tuples
+        :return: None
+        """
+        if self._index is not None:
+            for index, row in enumerate(rows, len(self)):
+                self._index[self._key(row)] = index
+        for row in rows:
+            for values, value in zip(self._data, row):
+                values.append(value)
+        for column, keys in enumerate(self._keys):
+            if keys is not None:
+                self._update_keys(column)
+
+    def append(self, row) -> None:
+        """
+        Add row.
+
+        :param row: row tuple
+        :return: None
+        """
+        self.extend([row])
+
+    def set_row(self, index, row) -> None:
+        """
+        Replace the row.
+
+        :param index: storage index
+        :param row: row tuple
+        :return: None
+        """
+        self.set_rows([(index, row)])
+
+    def set_rows(self, rows) -> None:
+        """
+        Replace rows at once, so they are sorted again only once.
+
+        :param rows: iterable of (storage index, row tuple)
+        :return: None
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._set_rows(rows)
+            self._changed()
+
+    def _set_rows(self, rows) -> None:
+        """
+        Replace rows. Must be called under the lock.
+
+        :param rows: list of (storage index, row tuple)
+        :return: None
+        """
+        for index, row in rows:
+            if self._changed_rows is not None:
+                self._changed_rows.add(index)
+            if self._index is not None:
+                self._index.pop(self._key(self._get_values(index)), None)
+                self._index[self._key(row)] = index
+            for column, (spec, value) in enumerate(zip(self._spec, row)):
+                self._data[column][index] = value
+                if self._keys[column] is not None and spec.key is not None:
+                    self._keys[column][index] = spec.key(value)
+
+    def remove(self, indexes) -> None:
+        """
+        Remove rows. Storage indexes of the following rows are changing.
+
+        :param indexes: iterable of the storage indexes
+        :return: None
+        """
+        indexes = set(indexes)
+        if not indexes:
+            return
+        with self._lock:
+            self._remove(indexes)
+            self._changed()
+
+    def _remove(self, indexes) -> None:
+        """
+        Remove rows. Must be called under the lock.
+        The remaining rows keep their order, sort keys and row keys, only their storage indexes are shifted.
+
+        :param indexes: set of the storage indexes
+        :return: None
+        """
+        def kept(values):
+            return (value for index, value in enumerate(values) if index not in indexes)
+
+        removed = sorted(indexes)
+        for column, spec in enumerate(self._spec):
+            self._data[column] = spec.make_storage(kept(self._data[column]))
+            if self._keys[column] is not None:
+                self._keys[column] = list(kept(self._keys[column]))
+        if self._order is not None:
+            order = array.array("q", (index - bisect.bisect_left(removed, index)
+                                      for index in self._order if index not in indexes))
+            self._order, self._positions = order, self._invert(order)
+        if self._index is not None:
+            self._index = {key: index - bisect.bisect_left(removed, index)
+                           for key, index in self._index.items() if index not in indexes}
+        if self._changed_rows is not None:
+            self._changed_rows = {index - bisect.bisect_left(removed, index)
+                                  for index in self._changed_rows if index not in indexes}
+            self._removed_rows.append(removed)
+
+    def clear(self) -> None:
+        """
+        Remove all rows.
+
+        :return: None
+        """
+        with self._lock:
+            self._data = [column.make_storage() for column in self._spec]
+            self._keys = [None] * self.columns
+            self._order = self._positions = None
+            self._index = None
+            self._changed_rows = self._removed_rows = None  # Order, sorted in the background, is of no use
+            self._changed()
+
+    def _get_values(self, index) -> tuple:
+        """
+        Get stored values of the row, as they were added.
+
+        :param index: storage index
+        :return: tuple
+        """
+        return tuple(values[index] for values in self._data)
+
+    def _get_key_index(self) -> dict:
+        """
+        Get storage indexes by the row keys. Must be called under the lock.
+
+        :return: dict
+        """
+        if self._key is None:
+            raise TypeError("Rows of the table model without the key function have no keys")
+        if self._index is None:
+            self._index = {self._key(row): index for index, row in enumerate(zip(*self._data))}
+        return self._index
+
+    def get_key(self, position):
+        """
+        Get key of the row.
+
+        :param position: display position of the row
+        :return: key
+        """
+        with self._lock:
+            return self._key(self._get_values(self.get_index(position))) if self._key is not None else None
+
+    def find(self, key):
+        """
+        Find the row by its key.
+
+        :param key: key of the row
+        :return: display position of the row, None if there is no such row
+        """
+        with self._lock:
+            index = self._get_key_index().get(key)
+            return None if index is None else self.get_position(index)
+
+    def find_all(self, keys) -> list:
+        """
+        Find the rows by their keys at once.
+
+        :param keys: iterable of the row keys
+        :return: list of the display positions of the found rows
+        """
+        with self._lock:
+            index, order, positions = self._get_key_index(), self._order, self._positions
+            found = [index[key] for key in keys if key in index]
+            if order is None:
+                return found
+            count = len(order)  # Rows, added after the last sorting, are displayed at the end
+            return [positions[idx] if idx < count else idx for idx in found]
+
+    def has_keys(self) -> bool:
+        """
+        Rows have keys (the model has the key function).
+
+        :return: bool
+        """
+        return self._key is not None
+
+    def get_row_key(self, row):
+        """
+        Get key of the row tuple of the stored values, e.g. of the row to "upsert".
+
+        :param row: row tuple
+        :return: key
+        """
+        return self._key(row)
+
+    def get_rows(self, keys) -> list:
+        """
+        Get displayed rows by their keys.
+
+        :param keys: iterable of the row keys
+        :return: list of (key, row tuple) of the found rows
+        """
+        with self._lock:
+            index = self._get_key_index()
+            return [(key, self._make_row(index[key])) for key in keys if key in index]
+
+    def iter_rows(self, chunk=4096):
+        """
+        Iterate keys and displayed rows in the storage order.
+
+        :param chunk: number of the rows, taken at once under the lock
+        :return: generator of (key, row tuple)
+        """
+        for start in range(0, len(self), chunk):
+            with self._lock:
+                rows = [(self._key(self._get_values(index)), self._make_row(index))
+                        for index in range(start, min(start + chunk, len(self)))]
+            yield from rows
+
+    def upsert(self, rows, removed=()):
+        """
+        Replace rows with the same keys, add the others and remove rows by the keys at once,
+        so they are sorted again only once.
+
+        :param rows: iterable of the row tuples
+        :param removed: iterable of the keys of the rows to remove
+        :return: Future of the sorting, None if not sorted or nothing is changed
+        """
+        rows, removed = list(rows), list(removed)
+        with self._lock:
+            index = self._get_key_index()
+            updated, added = {}, collections.OrderedDict()
+            for row in rows:
+                key = self._key(row)
+                if key in index:
+                    updated[index[key]] = row
+                else:
+                    added[key] = row
+            removed = {index[key] for key in removed if key in index}
+            if not (updated or added or removed):
+                return None
+
+            self._set_rows(list(updated.items()))
+            self._extend(list(added.values()))
+            if removed:
+                self._remove(removed)
+            return self._changed()
+
+    def _update_keys(self, column):
+        """
+        Compute sort keys of the column for the rows without them yet.
+        Must be called under the lock.
+
+        :param column: column index
+        :return: keys of the column
+        """
+        spec, values = self._spec[column], self._data[column]
+        if spec.key is None:
+            return values  # Values of the typed column are the keys
+        keys = self._keys[column]
+        if keys is None:
+            keys = self._keys[column] = []
+        keys.extend(spec.key(value) for value in values[len(keys):])
+
+        return keys
+
+    def get_sort(self) -> list:
+        """
+        Get keys of the current sort order.
+
+        :return: list of (column index, reverse), primary key first
+        """
+        return list(self._sort)
+
+    def sort_by(self, column, reverse=False) -> concurrent.futures.Future:
+        """
+        Sort by the column, then by the previous sort keys.
+
+        :param column: column index
+        :param reverse: descending order
+        :return: Future of the sorting, done when the new order is displayed
+        """
+        with self._lock:
+            self._sort = ([(column, reverse)] + [key for key in self._sort if key[0] != column])[:self.SORT_KEYS]
+            return self._resort()
+
+    def _resort(self) -> concurrent.futures.Future:
+        """
+        Sort by the current keys, in the background thread for the large tables.
+
+        :return: Future of the sorting
+        """
+        if len(self) <= self.SORT_THRESHOLD:
+            future = concurrent.futures.Future()
+            order, positions, _ = self._compute_order()
+            self._apply_order(order, positions)
+            future.set_result(None)
+            return future
+
+        if TableModel._sorter is None:
+            TableModel._sorter = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sugar-sort")
+        if self._sorting is None or self._sorting.done():
+            self._sorting = TableModel._sorter.submit(self._sort_background)
+
+        return self._sorting
+
+    def _sort_background(self) -> None:
+        """
+        Compute the order and merge the rows, changed meanwhile, into it.
+        The order is computed again only if the sort keys are changed or the rows are cleared.
+
+        :return: None
+        """
+        while True:
+            order, positions, (version, sort) = self._compute_order(track=True)
+            with self._lock:
+                if sort == self._sort and self._changed_rows is not None:
+                    if version != self.version:
+                        order = self._merge_changes(order)
+                        positions = self._invert(order)
+                    self._changed_rows = self._removed_rows = None
+                    self._apply_order(order, positions)
+                    return
+
+    def _merge_changes(self, order) -> array.array:
+        """
+        Merge the rows, changed since the order was computed, into it. Must be called under the lock.
+
+        Storage indexes of the order are shifted by the removals, the changed and the added rows
+        are taken out of it, sorted and inserted at their positions, found by the binary search.
+
+        :param order: permutation of the storage indexes, as they were when it was computed
+        :return: permutation of the current storage indexes
+        """
+        for removed in self._removed_rows:
+            indexes = set(removed)
+            order = [index - bisect.bisect_left(removed, index) for index in order if index not in indexes]
+
+        # Rows are removed keeping the order, so the rows, added since, are after all the sorted ones
+        count = len(order)
+        changed = {index for index in self._changed_rows if index < count}
+        changed.update(range(count, len(self)))
+        keys = [(self._update_keys(column), reverse) for column, reverse in self._sort]
+        kept = [index for index in order if index not in changed]
+        changed = sorted(changed)
+        for column_keys, reverse in reversed(keys):
+            changed.sort(key=column_keys.__getitem__, reverse=reverse)
+
+        def precedes(index, other) -> bool:
+            for column_keys, reverse in keys:
+                value, other_value = column_keys[index], column_keys[other]
+                if value != other_value:
+                    return value > other_value if reverse else value < other_value
+            return index < other  # Sorting is stable
+
+        merged, start = [], 0
+        for index in changed:
+            low, high = start, len(kept)
+            while low < high:
+                middle = (low + high) // 2
+                if precedes(kept[middle], index):
+                    low = middle + 1
+                else:
+                    high = middle
+            merged.extend(kept[start:low])
+            merged.append(index)
+            start = low
+        merged.extend(kept[start:])
+
+        return array.array("q", merged)
+
+    def _compute_order(self, track=False) -> tuple:
+        """
+        Compute the permutation of the rows for the current sort keys.
+
+        :param track: track the rows, changed while computing, to merge them later (see "_merge_changes")
+        :return: tuple of the permutation, its inverse and the (data version, sort keys) it is computed for
+        """
+        with self._lock:
+            version, count, sort = self.version, len(self), list(self._sort)
+            keys = [(self._update_keys(column), reverse) for column, reverse in sort]
+            if track:
+                self._changed_rows, self._removed_rows = set(), []
+
+        # Values before "count" are not moving, until "remove" (which makes new storage),
+        # and changes of them are detected by the version
+        order = list(range(count))
+        for column_keys, reverse in reversed(keys):  # Sorting is stable: least significant key first
+            order.sort(key=column_keys.__getitem__, reverse=reverse)
+
+        order = array.array("q", order)
+        return order, self._invert(order), (version, sort)
+
+    @staticmethod
+    def _invert(order) -> array.array:
+        """
+        Get inverse of the permutation, so the display position of the row is found at once.
+
+        :param order: permutation of the storage indexes
+        :return: display positions by the storage indexes
+        """
+        positions = array.array("q", [0]) * len(order)
+        for position, index in enumerate(order):
+            positions[index] = position
+        return positions
+
+    def _apply_order(self, order, positions) -> None:
+        """
+        Display rows in the new order.
+
+        :param order: permutation of the storage indexes
+        :param positions: inverse of the permutation
+        :return: None
+        """
+        with self._lock:
+            self._order, self._positions = order, positions
+            self._rows.clear()
+            self.changed(data=False)
@@ -5,9 +5,10 @@ Various buttons.
 import curses
 import curses.ascii
 import npyscreen
+from sugarui.widgets.damage import DamageMixin
 
 
-class TabButton(npyscreen.widget.Widget):
+class TabButton(DamageMixin, npyscreen.widget.Widget):
     """
     Tab button.
     """
@@ -79,6 +80,9 @@ class TabButton(npyscreen.widget.Widget):
         """
         self._is_active = state
 
+    def get_damage_state(self) -> tuple:
+        return super(TabButton, self).get_damage_state() + (self._title, self._is_active)
+
     def tab_width(self):
         """
         Get tab width.
@@ -115,7 +119,7 @@ class TabButton(npyscreen.widget.Widget):
                       self.width)
 
 
-class TabGroupBase(npyscreen.widget.Widget):
+class TabGroupBase(DamageMixin, npyscreen.widget.Widget):
     """
     Tab group base.
     """
@@ -138,6 +142,9 @@ class TabGroupBase(npyscreen.widget.Widget):
         else:
             self._label = None
 
+    def get_damage_state(self) -> tuple:
+        return super(TabGroupBase, self).get_damage_state() + (self._label, self._get_tabs_width())
+
     def _get_tabs_width(self):
         """
         Summarise tabs widths and spaces between.
@@ -3,9 +3,81 @@
 Text fields class.
 These are used to display some data in the tables.
 """
+import re
 import curses
+import collections
 import npyscreen
 from sugarui.windows.floating import ErrorMessageForm
+from sugarui.widgets.damage import DamageMixin
+
+
+class Highlighter:
+    """
+    Highlighter of the texts by the map of the substrings to their colors.
+
+    The map is compiled into one regular expression, matching all the substrings at once.
+    Longer substrings are preferred, where they overlap. Attributes of the highlighted
+    texts are cached, so the same text is not matched again while it is displayed.
+    """
+    CACHE_SIZE = 1024  # Highlighted texts in the cache
+    _compiled = {}  # Map items to the Highlighter, so the widgets with the same map share it
+
+    def __init__(self, highlight_map):
+        """
+        :param highlight_map: dict of the substrings to the color names of the theme
+        """
+        self._colors = {text: color for text, color in highlight_map.items() if text}
+        self._pattern = None
+        if self._colors:
+            self._pattern = re.compile("|".join(re.escape(text) for text in sorted(self._colors, key=len, reverse=True)))
+        self._attributes = None  # Substrings to the curses attributes, resolved by the first highlighted widget
+        self._cache = collections.OrderedDict()
+
+    @classmethod
+    def get(cls, highlight_map) -> "Highlighter":
+        """
+        Get compiled highlighter of the map.
+
+        :param highlight_map: dict of the substrings to the color names of the theme
+        :return: Highlighter
+        """
+        key = frozenset(highlight_map.items())
+        highlighter = cls._compiled.get(key)
+        if highlighter is None:
+            highlighter = cls._compiled[key] = cls(highlight_map)
+
+        return highlighter
+
+    def highlight(self, widget, text, width) -> list:
+        """
+        Get attributes of the text characters. Do not modify them, they are cached.
+
+        :param widget: widget, displaying the text (resolves the colors of the theme)
+        :param text: text to highlight
+        :param width: number of the characters to highlight
+        :return: list of curses attributes
+        """
+        key = text, width
+        attributes = self._cache.get(key)
+        if attributes is not None:
+            self._cache.move_to_end(key)
+            return attributes
+
+        text = text[:width]
+        attributes = [curses.A_NORMAL] * len(text)
+        if self._pattern is not None:
+            if self._attributes is None:
+                self._attributes = {substring: widget.parent.theme_manager.findPair(widget, color)
+                                    for substring, color in self._colors.items()}
+            for match in self._pattern.finditer(text):
+                start, end = match.span()
+                attributes[start:end] = [self._attributes[match.group()]] * (end - start)
+
+        self._cache[key] = attributes
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+        return attributes
 
 
 class ColoredTextField(npyscreen.Textfield):
@@ -19,22 +91,30 @@ class ColoredTextField(npyscreen.Textfield):
         self.syntax_highlighting = True
         self.highlight_map = {}
 
+    @property
+    def highlight_map(self) -> dict:
+        """
+        Map of the substrings to highlight to the color names of the theme.
+        It is compiled on assignment, so assign it again after it is changed.
+
+        :return: dict
+        """
+        return self._highlight_map
+
+    @highlight_map.setter
+    def highlight_map(self, highlight_map):
+        self._highlight_map = highlight_map or {}
+        self._highlighter = Highlighter.get(self._highlight_map)
+
     def colorise(self):
         """
-        On the current value highlight string that has value.
+        On the current value highlight all the occurrences of the substrings of the highlight map.
 
-        :param value: Value to highlight.
         :return:
         """
         if self.value:
-            hldata = [curses.A_NORMAL for _ in range(len(self.value))]
-            for value in self.highlight_map:
-                offset = self.value.find(value)
-                if offset > -1:
-                    hl_colorc = self.parent.theme_manager.findPair(self, self.highlight_map[value])
-                    hldata = hldata[:offset] + [hl_colorc for _ in range(len(value))] + hldata[offset + len(value):]
-            self._highlightingdata = hldata
-            del hldata
+            self._highlightingdata = self._highlighter.highlight(self, self.value,
+                                                                 self.begin_at + self.maximum_string_length)
 
     def update(self, clear=True, cursor=True):
         """
@@ -47,15 +127,20 @@ class ColoredTextField(npyscreen.Textfield):
         super(npyscreen.Textfield, self).update(clear, cursor)
 
 
-class VisualTextField(npyscreen.Textfield):
+class VisualTextField(DamageMixin, npyscreen.Textfield):
     """
     Text field with colored background.
     """
     def __init__(self, *args, **kwargs):
         kwargs["color"] = "CAUTIONHL"
         kwargs["max_height"] = 1
+        self._char_widths = {}
         npyscreen.Textfield.__init__(self, *args, **kwargs)
 
+    def get_damage_state(self) -> tuple:
+        return super(VisualTextField, self).get_damage_state() + (
+            self.cursor_position, self.begin_at, self.show_bold, self.important)
+
     def _print(self):
         """
         Create text content within the field.
@@ -63,7 +148,6 @@ class VisualTextField(npyscreen.Textfield):
         :return:
         """
         self._field_space()
-        width_of_char_to_print = 0
 
         string_to_print = self._get_string_to_print()
         if not string_to_print:
@@ -72,45 +156,67 @@ class VisualTextField(npyscreen.Textfield):
         string_to_print = self.display_value(self.value)[
                           self.begin_at:self.maximum_string_length + self.begin_at - self.left_margin]
 
-        column = 0
-        place_in_string = 0
         if self.syntax_highlighting:
             self.update_highlighting(start=self.begin_at,
                                      end=self.maximum_string_length + self.begin_at - self.left_margin)
-            while column <= (self.maximum_string_length - self.left_margin):
-                if not string_to_print or place_in_string > len(string_to_print) - 1:
-                    break
-                width_of_char_to_print = self.find_width_of_char(string_to_print[place_in_string])
-                if column - 1 + width_of_char_to_print > self.maximum_string_length:
-                    break
-                try:
-                    highlight = self._highlightingdata[self.begin_at + place_in_string]
-                except IndexError:
-                    highlight = curses.A_NORMAL
-                self.parent.curses_pad.addstr(self.rely, self.relx + column + self.left_margin,
-                                              self._print_unicode_char(string_to_print[place_in_string]),
-                                              highlight)
-                column += self.find_width_of_char(string_to_print[place_in_string])
-                place_in_string += 1
+            highlighting = (self._highlightingdata or [])[self.begin_at:self.begin_at + len(string_to_print)]
+            attributes = highlighting + [curses.A_NORMAL] * (len(string_to_print) - len(highlighting))
+            self._print_runs(string_to_print, attributes)
         else:
             color = self._get_color()
-            while column <= (self.maximum_string_length - self.left_margin):
-                if not string_to_print or place_in_string > len(string_to_print) - 1:
-                    if self.highlight_whole_widget:
-                        self.parent.curses_pad.addstr(self.rely, self.relx + column + self.left_margin, ' ', color)
-                        column += width_of_char_to_print
-                        place_in_string += 1
-                        continue
-                    else:
-                        break
-
-                width_of_char_to_print = self.find_width_of_char(string_to_print[place_in_string])
-                if column - 1 + width_of_char_to_print > self.maximum_string_length:
-                    break
-                self.parent.curses_pad.addstr(self.rely, self.relx + column + self.left_margin,
-                                              self._print_unicode_char(string_to_print[place_in_string]), color)
-                column += width_of_char_to_print
-                place_in_string += 1
+            column = self._print_runs(string_to_print, [color] * len(string_to_print))
+            space = self.maximum_string_length - self.left_margin + 1 - column
+            if self.highlight_whole_widget and space > 0:
+                self.parent.curses_pad.addstr(self.rely, self.relx + column + self.left_margin, " " * space, color)
+
+    def _print_runs(self, text, attributes) -> int:
+        """
+        Print text by the runs of the characters with the same attribute, one "addstr" per run.
+
+        :param text: text to print
+        :param attributes: attribute of each character
+        :return: column after the printed text
+        """
+        column = 0
+        run, run_column, run_attribute = [], 0, None
+        for char, attribute in zip(text, attributes):
+            width = self._get_char_width(char)
+            if column > self.maximum_string_length - self.left_margin or column - 1 + width > self.maximum_string_length:
+                break
+            if attribute != run_attribute:
+                self._print_run(run, run_column, run_attribute)
+                run, run_column, run_attribute = [], column, attribute
+            run.append(char)
+            column += width
+        self._print_run(run, run_column, run_attribute)
+
+        return column
+
+    def _print_run(self, run, column, attribute) -> None:
+        """
+        Print characters with the same attribute.
+
+        :param run: list of the characters
+        :param column: column of the first character
+        :param attribute: curses attribute
+        :return: None
+        """
+        if run:
+            text = "".join(run)
+            self.parent.curses_pad.addstr(self.rely, self.relx + column + self.left_margin,
+                                          text.encode("ascii", "replace") if self._force_ascii else text, attribute)
+
+    def _get_char_width(self, char) -> int:
+        """
+        Get display width of the character, cached per character.
+
+        :param char: character
+        :return: number of the columns
+        """
+        width = self._char_widths.get(char)
+        if width is None:
+            width = self._char_widths[char] = self.find_width_of_char(char)
+        return width
 
     def _field_space(self):
         """
@@ -118,10 +224,8 @@ class VisualTextField(npyscreen.Textfield):
 
         :return:
         """
-        line = " " * self.width
-        self.add_line(self.rely, self.relx, line, self.make_attributes_list(
-            line, self.parent.theme_manager.findPair(
-                self, self.color) | curses.A_STANDOUT | curses.A_BOLD | curses.A_DIM), self.width)
+        self.parent.curses_pad.addstr(self.rely, self.relx, " " * self.width, self.parent.theme_manager.findPair(
+            self, self.color) | curses.A_STANDOUT | curses.A_BOLD | curses.A_DIM)
 
     def _get_color(self):
         """
@@ -274,17 +378,6 @@ class ConcealedVisualTextField(VisualTextField):
         :return:
         """
         self._field_space()
-        color = self._get_color()
-
-        strlen = len(self.value)
-        if self.maximum_string_length < strlen:
-            tmp_x = self.relx
-            for i in range(self.maximum_string_length):
-                self.parent.curses_pad.addch(self.rely, tmp_x, self._mask, color)
-                tmp_x += 1
-
-        else:
-            tmp_x = self.relx
-            for i in range(strlen):
-                self.parent.curses_pad.addstr(self.rely, tmp_x, self._mask, color)
-                tmp_x += 1
+        masked = min(len(self.value or ""), self.maximum_string_length)
+        if masked:
+            self.parent.curses_pad.addstr(self.rely, self.relx, self._mask * masked, self._get_color())
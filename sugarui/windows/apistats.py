@@ -0,0 +1,88 @@
+# coding: utf-8
+"""
+API statistics.
+"""
+import time
+import npyscreen
+from sugarui.windows.forms import SugarForm
+from sugarui.widgets.table import TableHeader, Table
+
+
+class APIStatsForm(SugarForm):
+    """
+    API statistics form.
+    """
+    id = __name__
+
+    REFRESH_INTERVAL = 2  # Seconds between refreshing the statistics
+
+    def init(self):
+        h, w = self.useable_space()
+        self.add_handlers({
+            "d": self.on_dump,
+        })
+        self.w_summary = self.add(npyscreen.FixedText, rely=1, editable=False)
+        self.w_endpoints_header = self.add(TableHeader, title="Endpoints (d: dump to file)", rely=2, max_height=2,
+                                           headers=["Endpoint", "Requests", "Errors", "TTFB p95",
+                                                    "Total p50", "Total p95", "Total p99", "Wire KiB"])
+        self.w_endpoints = self.add(Table, relx=2, rely=4, max_height=h - 6)
+        self._refreshed = None
+
+    @staticmethod
+    def get_endpoint_row(endpoint, stats) -> tuple:
+        """
+        Get table row of the endpoint.
+
+        :param endpoint: name of the endpoint
+        :param stats: statistics of the endpoint
+        :return: tuple
+        """
+        def ms(value):
+            return "N/A" if value is None else "{:g}ms".format(value)
+
+        return (endpoint, stats["requests"], sum(stats["errors"].values()), ms(stats["ttfb"]["p95"]),
+                ms(stats["total"]["p50"]), ms(stats["total"]["p95"]), ms(stats["total"]["p99"]),
+                "{:.1f}".format(stats["wire_bytes"] / 0x400))
+
+    def load_stats(self):
+        """
+        Display current statistics.
+
+        :return:
+        """
+        stats = self.api.get_stats()
+        flight = stats["single_flight"]
+        frames = self.get_frame_stats()
+        calls = self.dispatcher.get_stats()
+        self.w_summary.value = ("Requests shared: {} of {}, in flight: {}. "
+                                "Frames: {}, idle: {}, coalesced: {}, widgets per frame: {}. "
+                                "UI calls: {}, pending: {}, blocked: {}. Updated: {}").format(
+            flight["shared"], flight["calls"], flight["in_flight"],
+            frames["frames"], frames["idle"], frames["coalesced"], frames["mean"],
+            calls["called"], calls["pending"], calls["blocked"], time.strftime("%T"))
+        self.w_endpoints.load_data([self.get_endpoint_row(endpoint, stats["endpoints"][endpoint])
+                                    for endpoint in sorted(stats["endpoints"])])
+        self._refreshed = time.monotonic()
+
+    def while_waiting(self):
+        """
+        Refresh statistics periodically.
+
+        :return:
+        """
+        super(APIStatsForm, self).while_waiting()
+        if self._refreshed is None or time.monotonic() - self._refreshed > self.REFRESH_INTERVAL:
+            self.load_stats()
+
+    def on_dump(self, *args, **kwargs):
+        """
+        Dump statistics to the configured JSON lines file.
+
+        :return:
+        """
+        try:
+            self.api.stats.dump()
+        except Exception as ex:
+            self.on_api_error(ex)
+        else:
+            npyscreen.notify_wait("Statistics are dumped to {}".format(self.api.stats.dump_path), title="API Stats")
@@ -1,12 +1,17 @@
 # coding: utf-8
 """
 Basic forms.
-This overrides npyscreen's forms, allowing concurrent widget updates.
+This overrides npyscreen's forms, allowing concurrent widget updates
+through the UI dispatcher and repainting only the changed widgets.
 """
 import sys
+import time
 import curses
+import concurrent.futures
 import npyscreen
-from sugarui.windows.floating import HelpForm
+from sugarui.dispatcher import UIDispatcher
+from sugarui.windows.floating import HelpForm, ErrorMessageForm
+from sugarui.widgets.damage import DamageMixin, get_widget_state
 
 
 class SugarForm(npyscreen.FormBaseNewWithMenus):
@@ -14,6 +19,8 @@ class SugarForm(npyscreen.FormBaseNewWithMenus):
     Main form with the menus.
     """
     id = "MAIN"
+    STREAM_FLUSH_INTERVAL = 0.1  # Seconds between delivering batches of streamed items
+    MAX_FPS = 20  # Frames per second of the live updates, see "request_frame"
 
     # npyscreen is not introspecting instances, but classes.
     # So therefore it is not possible right now to add form switches "on_load_<something>"
@@ -22,7 +29,17 @@ class SugarForm(npyscreen.FormBaseNewWithMenus):
     # the name of the function "on_load_<lowercase-classname-of-the-form>" and
     # get its target form ID by referencing the function name in the "_form_id_map".
 
-    def __init__(self, api, *args, **kwargs):
+    def __init__(self, api, *args, max_fps=None, **kwargs):
+        self._painted = {}  # Painted states of npyscreen widgets, sugarui widgets keep their own
+        self._frames = {"frames": 0, "idle": 0, "painted": 0, "last": 0, "max": 0, "requested": 0, "coalesced": 0}
+        self._framed = 0.0  # Time of the last frame
+        self._fast_ticks = False
+        self._keypress_timeout = None  # Timeout of the keys, while the ticks are fast
+        self.max_fps = max_fps or self.MAX_FPS
+        # Callbacks from the background threads, called in "while_waiting" of the form on the screen
+        self.dispatcher = getattr(kwargs.get("parentApp"), "dispatcher", None)
+        if self.dispatcher is None:
+            self.dispatcher = UIDispatcher()
         npyscreen.FormBaseNewWithMenus.__init__(self, *args, **kwargs)
         self.api = api
         self.handlers.update({
@@ -71,6 +88,228 @@ class SugarForm(npyscreen.FormBaseNewWithMenus):
         """
         raise NotImplementedError("This method should be overridden")
 
+    def invalidate(self, widget=None) -> None:
+        """
+        Repaint the widget on the next frame.
+
+        :param widget: widget of the form, None for all the widgets
+        :return: None
+        """
+        for widget in (self._widgets__ if widget is None else [widget]):
+            if isinstance(widget, DamageMixin):
+                widget.invalidate()
+            else:
+                self._painted.pop(widget, None)
+
+    def _paint_widget(self, widget) -> bool:
+        """
+        Repaint the widget, if it is damaged.
+
+        :param widget: widget of the form
+        :return: True, if the widget was repainted
+        """
+        if isinstance(widget, DamageMixin):
+            if not widget.is_damaged():
+                return False
+        else:
+            state = get_widget_state(widget)
+            if self._painted.get(widget) == state:
+                return False
+            self._painted[widget] = state
+
+        if widget.hidden:
+            widget.clear()
+        else:
+            widget.update()
+        if isinstance(widget, DamageMixin):
+            widget.painted()
+
+        return True
+
+    def refresh(self):
+        """
+        Paint the frame: repaint only the damaged widgets, then refresh the screen once.
+        npyscreen calls it after every key and every "while_waiting".
+        Forms, which are not on the screen, are not painted: their widgets,
+        updated by the UI calls, stay damaged until the form is displayed.
+
+        :return:
+        """
+        if not self.editing:
+            return
+        painted = sum(self._paint_widget(widget) for widget in self._widgets__)
+        self._framed = time.monotonic()
+        self._set_fast_ticks(bool(self.dispatcher))
+        self._frames["frames"] += 1
+        self._frames["idle"] += not painted
+        self._frames["painted"] += painted
+        self._frames["last"] = painted
+        self._frames["max"] = max(self._frames["max"], painted)
+        super(SugarForm, self).refresh()
+
+    def request_frame(self) -> None:
+        """
+        Paint a frame for the live update, e.g. the progress, at most "max_fps" times per second.
+        Updates in between are coalesced: their widgets stay damaged and are painted
+        by the next frame, the latest value last. That is the next request after the interval,
+        the next key or the next "while_waiting" tick, whichever comes first.
+        While the frame is pending, the ticks are fast, so it is not left behind.
+
+        :return: None
+        """
+        self._frames["requested"] += 1
+        if time.monotonic() - self._framed >= 1.0 / self.max_fps:
+            self.refresh()
+        else:
+            self._frames["coalesced"] += 1
+            self._set_fast_ticks(True)
+
+    def _set_fast_ticks(self, fast) -> None:
+        """
+        Call "while_waiting" by the shortest ticks (0.1 second) while the work is left for the next tick,
+        e.g. a coalesced frame or the UI calls over the budget. Restore the ticks of the form after.
+
+        :param fast: work is left for the next tick
+        :return: None
+        """
+        if fast and not self._fast_ticks:
+            self._keypress_timeout, self.keypress_timeout = self.keypress_timeout, 1
+        elif self._fast_ticks and not fast:
+            self.keypress_timeout = self._keypress_timeout
+        self._fast_ticks = fast
+
+    def display(self, clear=False):
+        """
+        Repaint the whole form.
+
+        :param clear: npyscreen-related, the screen is erased anyway
+        :return:
+        """
+        if curses.has_colors() and not npyscreen.npysGlobalOptions.DISABLE_ALL_COLORS:
+            self.curses_pad.attrset(0)
+            color_attribute = self.theme_manager.findPair(self, self.color)
+            self.curses_pad.bkgdset(" ", color_attribute)
+            self.curses_pad.attron(color_attribute)
+        self.curses_pad.erase()
+        self.draw_form()
+        self.invalidate()
+        self.refresh()
+
+    def get_frame_stats(self) -> dict:
+        """
+        Get counters of the painted frames.
+
+        :return: dict of the frames, idle frames (nothing painted), widgets painted in total,
+                 in the last frame, at most per frame and on average per frame,
+                 frames requested by the live updates and coalesced into the later frames
+        """
+        stats = dict(self._frames)
+        stats["mean"] = round(stats["painted"] / stats["frames"], 3) if stats["frames"] else 0
+
+        return stats
+
+    def post(self, callback, *args, key=None) -> None:
+        """
+        Call the callback later on the UI loop (see "while_waiting").
+        This is safe to be called from any thread. Background threads wait, while the dispatcher is full.
+
+        :param callback: callable
+        :param args: arguments to the callable
+        :param key: pending call of the same key is replaced, e.g. by the latest progress
+        :return: None
+        """
+        self.dispatcher.post(callback, *args, key=key)
+
+    def api_call(self, func, *args, on_result=None, on_error=None, **kwargs) -> concurrent.futures.Future:
+        """
+        Call API in the background, so the form is not blocked by the network.
+        Callbacks are called later on the UI loop, so they are safe to update widgets.
+
+        :param func: API callable, e.g. "self.api.systems.get_status"
+        :param args: arguments to the API callable
+        :param on_result: callback, accepting the result of the call
+        :param on_error: callback, accepting the exception of the call. Default is "on_api_error".
+        :param kwargs: keywords to the API callable
+        :return: Future of the call
+        """
+        future = self.api.submit(func, *args, **kwargs)
+        future.add_done_callback(lambda ftr: self.post(self._on_api_done, ftr, on_result, on_error or self.on_api_error))
+
+        return future
+
+    def api_stream(self, func, *args, on_items=None, on_result=None, on_error=None, **kwargs):
+        """
+        Consume API generator in the background, delivering items
+        in batches to the UI loop while they are still coming.
+
+        :param func: API generator function, e.g. "self.api.systems.iter_status"
+        :param args: arguments to the API generator function
+        :param on_items: callback, accepting a list of next items
+        :param on_result: callback, called without arguments after the last item
+        :param on_error: callback, accepting the exception of the call. Default is "on_api_error".
+        :param kwargs: keywords to the API generator function
+        :return: Future of the call
+        """
+        def consume():
+            batch = []
+            flushed = time.monotonic()
+            for item in func(*args, **kwargs):
+                batch.append(item)
+                if time.monotonic() - flushed > self.STREAM_FLUSH_INTERVAL:
+                    self.post(on_items, batch)
+                    batch = []
+                    flushed = time.monotonic()
+            if batch:
+                self.post(on_items, batch)
+
+        return self.api_call(consume, on_result=on_result and (lambda _: on_result()), on_error=on_error)
+
+    def _on_api_done(self, future, on_result, on_error):
+        """
+        Deliver result of the finished background API call to its callbacks.
+
+        :param future: Future of the call
+        :param on_result: result callback
+        :param on_error: error callback
+        :return:
+        """
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            on_error(error)
+        elif on_result is not None:
+            on_result(future.result())
+
+    def process_ui_calls(self):
+        """
+        Call callbacks, posted from the background threads, within the time budget of the tick.
+        The rest is called by the next ticks.
+
+        :return:
+        """
+        self.dispatcher.process()
+
+    def on_api_error(self, error):
+        """
+        Display an error of the background API call.
+
+        :param error: exception
+        :return:
+        """
+        msg = str(error) or error.__class__.__name__
+        alert = ErrorMessageForm(msg, min(len(msg) + 6, self.columns - 2), 7, passive_text=True, name="API Error")
+        alert.center_on_display()
+        alert.edit()
+
+    def while_waiting(self):
+        """
+        Called by npyscreen on the UI loop while there is no key pressed.
+
+        :return:
+        """
+        self.process_ui_calls()
+
     def create_menu(self):
         """
         Create menus
@@ -129,10 +368,21 @@ class SugarForm(npyscreen.FormBaseNewWithMenus):
         """
         self.parentApp.switchForm(self._form_id_map["on_load_modulerunnerform"])
 
+    def on_load_apistatsform(self, *args, **kwargs):
+        """
+        On load API statistics form.
+
+        :return:
+        """
+        self.parentApp.switchForm(self._form_id_map["on_load_apistatsform"])
+
     def on_exit(self, *args, **kwargs):
         self.editing = False
         self.parentApp.switchFormNow()
-        sys.exit(1)
+        try:
+            self.api.close()  # Dumps statistics, stops the event stream and closes the snapshot
+        finally:
+            sys.exit(1)
 
     def on_help(self, *args, **kwargs):
         """
@@ -160,5 +410,9 @@ On each table:
             next item, "p" for the previous item.
 
   Up/Down - To go up/down on the items.
+
+  s       - To sort by the next column,
+            then by the previous sort order.
+  S       - To reverse the sort order.
             """.format(b=curses.A_BOLD, r=curses.A_NORMAL)
         HelpForm(text, width, height, name="Help").edit()
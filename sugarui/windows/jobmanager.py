@@ -26,6 +26,12 @@ class JobManager(SugarForm):
     f_modules_run = None
     f_state_run = None
 
+    HISTORY_TITLE = "Job History"
+
+    _history = None  # PageIterator of the job history
+    _history_page = None  # Future of the requested page
+    _jobs = None  # Loaded job records, newest first
+
     def init(self):
         """
         Create form layout, place widgets.
@@ -44,7 +50,8 @@ class JobManager(SugarForm):
             "warnings": "WARNING",
         }
 
-        self.add(TableHeader, title="Job History", headers=["Date"], max_height=2, max_width=40, rely=1)
+        self.f_state_process.w_jobs_header = self.add(TableHeader, title=self.HISTORY_TITLE, headers=["Job"],
+                                                      max_height=2, max_width=40, rely=1)
         self.f_state_process.w_jobs_pane = self.add(Table, relx=2, rely=3, max_width=39)
 
         self.add(TableDivider, relx=41, rely=1)
@@ -54,6 +61,66 @@ class JobManager(SugarForm):
         self.f_state_process.w_progressbar = self.add(ProgressBar, name="Progress", relx=42,
                                                       editable=False, max_height=3)
         self.load_sample_data()
+        self.load_jobs_data()
+        # Pending events of the same job are coalesced, only the latest progress is displayed
+        self.api.events.add_listener(self.api.events.JOB,
+                                     lambda event, job: self.post(self.on_job_event, job, key=("job", job.get("jid"))))
+
+    @staticmethod
+    def get_job_row(job) -> tuple:
+        """
+        Get table row of the job.
+
+        :param job: job record
+        :return: tuple
+        """
+        return job.get("jid"),
+
+    def load_jobs_data(self):
+        """
+        Display job history from the snapshot of the previous session right away,
+        marked as stale, and request the first page of the history in the background.
+        Next pages are requested as the cursor reaches the last loaded job.
+
+        :return:
+        """
+        jobs = self.api.jobs.load_snapshot()
+        if jobs:
+            self.f_state_process.w_jobs_header.set_title("{} (stale)".format(self.HISTORY_TITLE))
+            self.f_state_process.w_jobs_pane.load_data([self.get_job_row(job) for job in jobs])
+        self._jobs = []
+        self._history = self.api.jobs.iter_history()
+        self.f_state_process.w_jobs_pane.add_on_more_callback(self.load_jobs_page)
+        self.load_jobs_page()
+
+    def load_jobs_page(self):
+        """
+        Request the next page of the job history, unless it is being requested already.
+        Failed page is requested again on the next call.
+
+        :return:
+        """
+        if self._history_page is None or self._history_page.done():
+            self._history_page = self.api_call(self._history.next_page, on_result=self.on_jobs_loaded)
+
+    def on_jobs_loaded(self, jobs):
+        """
+        Display the next page of the job history from the master. The first page replaces the stale snapshot.
+        Changed widgets are repainted by the next frame.
+
+        :param jobs: list of job records
+        :return:
+        """
+        rows = [self.get_job_row(job) for job in jobs]
+        if not self._jobs:
+            self.f_state_process.w_jobs_header.set_title(self.HISTORY_TITLE)
+            self.f_state_process.w_jobs_pane.load_data(rows)
+        else:
+            self.f_state_process.w_jobs_pane.add_data(rows)
+        saved = len(self._jobs) < self.api.jobs.RECENT  # Snapshot keeps only the recent jobs
+        self._jobs.extend(jobs)
+        if jobs and saved:
+            self.api_call(self.api.jobs.save_snapshot, list(self._jobs))
 
     def load_sample_data(self):
         import time
@@ -65,10 +132,15 @@ class JobManager(SugarForm):
             data.append(("{}.some.lan".format(hostname), status, time.strftime("%T, %D")))
         self.f_state_process.w_clients_pane.load_data(data)
 
-        data = []
-        for x in range(10):
-            data.append((time.strftime("%T, %D"),))
-        self.f_state_process.w_jobs_pane.load_data(data)
+    def on_job_event(self, job):
+        """
+        Display progress of the running job, pushed by the master.
+
+        :param job: job record with "progress" in percents
+        :return:
+        """
+        if job.get("progress") is not None:
+            self.f_state_process.w_progressbar.set_value(job["progress"])
 
     def on_beep(self):
         curses.beep()
@@ -6,6 +6,7 @@ import time
 import npyscreen
 from sugarui.windows.forms import SugarForm
 from sugarui.widgets.table import TableHeader, Table, TableDivider
+from sugarui.widgets.tablemodel import TableModel, Column
 from sugarui.widgets.tabs import TabButton, TabGroup, TabController
 
 
@@ -20,11 +21,20 @@ class SystemOverviewForm(SugarForm):
     TAB_PDATA = 3
     TAB_PACKAGES = 4
 
+    SYNC_INTERVAL = 5  # Seconds between synchronisations of the inventory
+    PUSHED_SYNC_INTERVAL = 300  # Seconds between synchronisations, while changes are pushed by the master
+    TITLE = "Selected Clients"
+
     def init(self):
         h, w = self.useable_space()
-        self.w_clients_list_header = self.add(TableHeader, title="Selected Clients",
+        self.w_clients_list_header = self.add(TableHeader, title=self.TITLE,
                                               headers=["Hostname"], max_height=2, max_width=40, rely=1)
         self.w_clients_list = self.add(Table, relx=2, rely=3, max_width=39, max_height=h - 5)
+        self.clients = TableModel([
+            Column("Hostname", key=lambda system: system.host),
+            Column("Status", typecode="b", display=lambda online: "online" if online else "offline"),
+        ], key=lambda row: row[0].id)
+        self.w_clients_list.load_data(self.clients)
         self.w_clients_list.add_on_select_callback(self.set_system_details)
 
         self.w_clients_div = self.add(TableDivider, relx=41, rely=1, max_width=1)
@@ -50,17 +60,109 @@ class SystemOverviewForm(SugarForm):
         tab.add_widget(npyscreen.BoxBasic, name="shit", relx=44, rely=5, max_height=5)
 
         self.tabs.align()
-        self.load_systems_data()
+
+        self._synced = None
+        self._sync = None
+        self.api.systems.add_change_listener(lambda events: self.post(self.on_systems_changed, events))
+        if not self.load_systems_snapshot():
+            self.load_systems_data()
+
+    def load_systems_snapshot(self) -> bool:
+        """
+        Display systems from the snapshot of the previous session right away.
+        They are marked as stale, until synchronised with the master in the background.
+
+        :return: True, if there was a snapshot
+        """
+        systems = self.api.systems.load_snapshot()
+        if not systems:
+            return False
+
+        self.w_clients_list_header.set_title("{} (stale)".format(self.TITLE))
+        self.clients.clear()
+        self.on_systems_data(systems)
+        self._synced = time.monotonic()
+        self._sync = self.api_call(self.api.systems.sync, on_result=self.on_systems_synced)
+
+        return True
 
     def load_systems_data(self):
         """
-        Call API and load systems data.
+        Call API in the background to load systems data.
+        Systems are displayed while they are still downloading.
+
+        :return:
+        """
+        self.clients.clear()
+        self.api_stream(self.api.systems.iter_status, on_items=self.on_systems_data, on_result=self.on_systems_loaded)
+
+    @staticmethod
+    def get_system_row(system) -> tuple:
+        """
+        Get table row of the system.
+
+        :param system: System
+        :return: tuple
+        """
+        return system, system.online
+
+    def on_systems_loaded(self):
+        """
+        All systems are loaded, further changes are synchronised.
+
         :return:
         """
-        data = [(host, "online" if host.data["online"] else "offline") for host in self.api.systems.get_status()]
-        self.w_clients_list.load_data(data)
-        if data:
+        self._synced = time.monotonic()
+
+    def on_systems_synced(self, events):
+        """
+        Inventory is synchronised with the master, so it is not stale anymore.
+        Changes are displayed by "on_systems_changed".
+
+        :param events: list of (event, system) tuples
+        :return:
+        """
+        self.w_clients_list_header.set_title(self.TITLE)
+
+    def on_systems_changed(self, events):
+        """
+        Display changed systems. Only the lines of the changed systems are repainted.
+
+        :param events: list of (event, system) tuples
+        :return:
+        """
+        self.w_clients_list.upsert([self.get_system_row(system) for event, system in events
+                                    if event != self.api.systems.REMOVED],
+                                   removed=[system.id for event, system in events if event == self.api.systems.REMOVED])
+
+    def while_waiting(self):
+        """
+        Synchronise inventory periodically. While the event stream is connected,
+        changes are pushed, so synchronisation is rare and only a safety net.
+
+        :return:
+        """
+        super(SystemOverviewForm, self).while_waiting()
+        interval = self.PUSHED_SYNC_INTERVAL if self.api.events.connected else self.SYNC_INTERVAL
+        if self._synced is not None and (self._sync is None or self._sync.done()) \
+                and time.monotonic() - self._synced > interval:
+            self._synced = time.monotonic()
+            self._sync = self.api_call(self.api.systems.sync, on_result=self.on_systems_synced)
+
+    def on_systems_data(self, systems):
+        """
+        Display next loaded systems.
+
+        :param systems: list of systems
+        :return:
+        """
+        data = [self.get_system_row(system) for system in systems]
+        first = not self.clients
+        self.clients.extend(data)
+        if first and data:
             self.set_system_details(data[0])
+        else:
+            self.w_clients_list.request_frame()
 
     def set_system_details(self, columns):
         """
@@ -69,24 +171,12 @@ class SystemOverviewForm(SugarForm):
         :param columns:
         :return:
         """
-        value = columns[0]
-        self.summary_tab.w_hostname.set_value(value.data["host"])
-        self.summary_tab.w_machine_id.set_value(value.data["id"])
-        self.summary_tab.w_os.set_value("Linux")
+        value = self.api.systems.lookup(columns[0].id) or columns[0]
+        self.summary_tab.w_hostname.set_value(value.host)
+        self.summary_tab.w_machine_id.set_value(value.id)
+        self.summary_tab.w_os.set_value(value.os or "N/A")
 
         self.summary_tab.w_uptodate.entry_widget.color = "VERYGOOD" # "CAUTIONHL"
         self.summary_tab.w_uptodate.set_value(" Up to date ")
 
         self.refresh()
-
-    def refresh(self):
-        """
-        Recalculate widget sizes and reposition on each refresh.
-
-        :return:
-        """
-        super(SystemOverviewForm, self).refresh()
-
-        for widget in [self.summary_tab.w_hostname, self.summary_tab.w_machine_id,
-                       self.summary_tab.w_os, self.summary_tab.w_uptodate, self.w_clients_list]:
-            widget.update()
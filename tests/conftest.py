@@ -0,0 +1,29 @@
+# coding: utf-8
+"""
+Fixtures of the tests against the local stand-in of the master.
+"""
+import types
+import pytest
+
+from sugarui.apiconnector import SugarAPIClient
+from sugarui.devel.fakemaster import FakeMaster
+
+
+@pytest.fixture(scope="session")
+def master():
+    """
+    Fake master with a small fleet. The fleet is changed only by the tests.
+    """
+    with FakeMaster(systems=200, history=300, seed=1).start() as master:
+        yield master
+
+
+@pytest.fixture(scope="session")
+def api(master):
+    """
+    API client of the fake master. The client is a singleton, so it is shared by all the tests.
+    """
+    config = types.SimpleNamespace(crypto=types.SimpleNamespace(ssl=types.SimpleNamespace(verify=False)))
+    api = SugarAPIClient(config, url=master.url)
+    yield api
+    api.close()
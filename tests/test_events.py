@@ -0,0 +1,174 @@
+# coding: utf-8
+"""
+Tests of the event stream, pushed by the master.
+"""
+import time
+import queue
+import socket
+import threading
+
+from sugarui.apiconnector import EventStream, iter_server_events
+
+TIMEOUT = 5
+
+
+def get_events(events, count) -> list:
+    """
+    Get received events.
+
+    :param events: queue of (event, data) tuples
+    :param count: number of the events
+    :return: list of (event, data) tuples
+    """
+    return [events.get(timeout=TIMEOUT) for _ in range(count)]
+
+
+def start_stream(api, listeners, last_event_id=None) -> EventStream:
+    """
+    Start receiving the events, waiting until the stream is connected.
+
+    :param api: API client
+    :param listeners: list of (event, callback) tuples
+    :param last_event_id: ID of the last event, received by the previous stream
+    :return: EventStream
+    """
+    stream = EventStream(api)
+    for event, callback in listeners:
+        stream.add_listener(event, callback)
+    stream.last_event_id = last_event_id
+    stream.start()
+    deadline = time.monotonic() + TIMEOUT
+    while not stream.connected:
+        assert time.monotonic() < deadline, "Event stream is not connected"
+        time.sleep(0.01)
+
+    return stream
+
+
+def get_free_url() -> str:
+    """
+    Get URL, where nobody listens.
+
+    :return: URL
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return "http://127.0.0.1:{}".format(sock.getsockname()[1])
+
+
+class RecordedWaits(threading.Event):
+    """
+    Stop event of the stream, recording delays of the reconnections without waiting for them.
+    """
+    def __init__(self, count):
+        """
+        :param count: number of the reconnections, before the stream is stopped
+        """
+        threading.Event.__init__(self)
+        self.count = count
+        self.timeouts = []
+
+    def wait(self, timeout=None):
+        self.timeouts.append(timeout)
+        if len(self.timeouts) >= self.count:
+            self.set()
+        return self.is_set()
+
+
+def test_server_events_across_chunks():
+    """
+    Events are the same, however the stream is split into the chunks.
+    """
+    body = ("retry: 1500\r\n\r\n: heartbeat\n\n"
+            "id: 7\nevent: system\ndata: {\"host\": \"café\"}\n\n"
+            "id: 8\r\nevent: job\r\ndata: first\r\ndata: second\r\n\r\n"
+            "data: no id\r\r").encode("utf-8")
+    expected = [
+        (None, None, None, 1.5),
+        ("7", "system", "{\"host\": \"café\"}", None),
+        ("8", "job", "first\nsecond", None),
+        (None, "message", "no id", None),
+    ]
+    assert list(iter_server_events([body])) == expected
+    for size in range(1, 8):
+        chunks = [body[idx:idx + size] for idx in range(0, len(body), size)]
+        assert list(iter_server_events(chunks)) == expected, size
+
+
+def test_resume_after_last_event_id(master, api):
+    """
+    Reconnected stream gets the events, sent while it was disconnected, and only them.
+    """
+    events = queue.Queue()
+    stream = start_stream(api, [(EventStream.SYSTEM, lambda event, data: events.put(event))])
+    master.fleet.churn(5)
+    get_events(events, 5)
+    stream.stop()
+    assert stream.last_event_id == str(master.fleet.revision)
+    assert stream._retry == master.RETRY  # Advised by the master
+
+    missed = master.fleet.revision
+    master.fleet.churn(3)
+    stream = start_stream(api, [(EventStream.SYSTEM, lambda event, data: events.put(event)),
+                                (EventStream.RESET, lambda event, data: events.put(event))],
+                          last_event_id=stream.last_event_id)
+    try:
+        assert get_events(events, 3) == [EventStream.SYSTEM] * 3
+        deadline = time.monotonic() + TIMEOUT
+        while stream.last_event_id != str(missed + 3):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert events.empty()
+    finally:
+        stream.stop()
+
+
+def test_reset_and_resync(master, api):
+    """
+    If events since the last one are not kept by the master, the stream is reset
+    and the inventory is synchronised again.
+    """
+    api.systems.sync()
+    master.fleet.churn(10)
+    events = queue.Queue()
+    stream = start_stream(api, [(EventStream.RESET, api.systems.on_event),
+                                (EventStream.RESET, lambda event, data: events.put(event))], last_event_id="0")
+    try:
+        assert get_events(events, 1) == [EventStream.RESET]
+    finally:
+        stream.stop()
+
+    assert stream.last_event_id == str(master.fleet.revision)
+    assert {system.id for system in api.systems._by_id.values()} == set(master.fleet.systems)
+
+
+def test_reconnect_backoff(api):
+    """
+    Delay of the reconnection is doubled after each failure, up to the maximum.
+    """
+    stream = EventStream(api)
+    stream._api_root_url = get_free_url()
+    stream._stopped = RecordedWaits(7)
+    stream._run()
+
+    assert stream._stopped.timeouts == [3, 6, 12, 24, 48, 60, 60]
+
+
+def test_reconnect_after_success(api, master):
+    """
+    Delay of the reconnection starts over after the stream received events.
+    """
+    class FlakyStream(EventStream):
+        results = [ConnectionError, ConnectionError, True, ConnectionError, False]
+
+        def _read(self):
+            result = self.results.pop(0)
+            if result is ConnectionError:
+                raise result()
+            return result
+
+    stream = FlakyStream(api)
+    stream._stopped = RecordedWaits(5)
+    stream._run()
+
+    assert stream._stopped.timeouts == [3, 6, 3, 6, 12]
@@ -0,0 +1,26 @@
+# coding: utf-8
+"""
+Tests of the local snapshot of the API data.
+"""
+
+
+def test_unusable_snapshot_is_skipped(api, tmp_path):
+    """
+    The snapshot is only a cache, so if its file can't be opened, the client works without it.
+    """
+    (tmp_path / "file").touch()
+    assert api._get_snapshot(str(tmp_path)) is None  # Directory
+    assert api._get_snapshot(str(tmp_path / "file" / "snapshot.db")) is None  # Parent is a file
+
+
+def test_broken_snapshot_is_started_over(api, tmp_path):
+    """
+    Broken snapshot file is replaced with the empty snapshot.
+    """
+    path = tmp_path / "snapshot.db"
+    path.write_bytes(b"not a database" * 100)
+    snapshot = api._get_snapshot(str(path))
+    try:
+        assert snapshot.load_jobs() == []
+    finally:
+        snapshot.close()
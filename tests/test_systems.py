@@ -0,0 +1,97 @@
+# coding: utf-8
+"""
+Tests of the inventory synchronisation with the master.
+"""
+import pytest
+
+from sugarui.apiconnector import Systems
+
+
+@pytest.fixture
+def systems(api, monkeypatch):
+    """
+    Systems connector with the empty inventory, recording the queries of its requests.
+    """
+    systems = Systems(api)
+    systems.queries = []
+    request = systems._request
+
+    def record(uri, query=None, **kwargs):
+        systems.queries.append(query)
+        return request(uri, query=query, **kwargs)
+
+    monkeypatch.setattr(systems, "_request", record)
+    return systems
+
+
+def get_inventory(systems) -> dict:
+    """
+    Get the inventory as the master records.
+
+    :param systems: Systems connector
+    :return: dict of system ID to (host, online, os)
+    """
+    return {system.id: system.get_state() for system in systems._by_id.values()}
+
+
+def get_fleet(master) -> dict:
+    """
+    Get the fleet of the master.
+
+    :param master: FakeMaster
+    :return: dict of system ID to (host, online, os)
+    """
+    return {sid: (system["host"], system["online"], system["os"]) for sid, system in master.fleet.systems.items()}
+
+
+def test_cold_start_keeps_revision(master, systems):
+    """
+    Inventory, downloaded as a stream, is followed by the delta sync.
+    """
+    assert len(list(systems.iter_status())) == len(master.fleet.systems)
+    assert systems._revision == master.fleet.revision
+
+    assert systems.sync() == []
+    assert systems.queries == [{"since": master.fleet.revision}]
+
+
+def test_delta_sync(master, systems):
+    """
+    Only the changes since the previous sync are requested and merged.
+    """
+    systems.sync()
+    revision = master.fleet.revision
+    master.fleet.churn(30)
+    events = systems.sync()
+
+    assert systems.queries == [None, {"since": revision}]
+    assert events
+    assert systems._revision == master.fleet.revision
+    assert get_inventory(systems) == get_fleet(master)
+
+
+def test_fallback_to_full_fetch(master, systems):
+    """
+    If the master does not know the revision, it answers with the complete inventory,
+    which is compared to the current one.
+    """
+    systems.sync()
+    before = get_inventory(systems)
+    master.fleet.churn(30)
+    systems._revision = master.fleet.revision + 1000  # E.g. the master was restarted
+    events = systems.sync()
+
+    assert systems._revision == master.fleet.revision
+    assert get_inventory(systems) == get_fleet(master)
+    removed = {system.id for event, system in events if event == Systems.REMOVED}
+    assert removed == set(before) - set(get_fleet(master))
+    changed = {system.id for event, system in events if event != Systems.REMOVED}
+    assert changed == {sid for sid, state in get_fleet(master).items() if before.get(sid) != state}
+
+
+def test_inventory_is_not_cached(api, systems):
+    """
+    Decoded inventory is not kept by the response cache, only its compact records are kept.
+    """
+    systems.sync()
+    assert not [key for key in api.cache._entries if key[1] == "/clients/status"]
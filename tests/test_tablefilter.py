@@ -0,0 +1,32 @@
+# coding: utf-8
+"""
+Tests of the incremental table filter.
+"""
+import random
+
+from sugarui.widgets.tablefilter import FilterIndex
+
+
+def test_matches_follow_changed_rows():
+    """
+    Matches of the kept queries are the same as of the scan, after the rows are changed and removed.
+    """
+    rnd = random.Random(1)
+    texts = {"id-{}".format(idx): "host-{:04d}.{}".format(idx, rnd.choice(("dc1", "dc2", "lab")))
+             for idx in range(500)}
+    index = FilterIndex(texts)
+    queries = ["host-00", "host-004", "dc", "dc1", "lab", "1.d"]
+    for query in queries:
+        index.find(query)
+
+    for step in range(200):
+        key = "id-{}".format(rnd.randrange(600))
+        if rnd.random() < 0.2:
+            texts.pop(key, None)
+            index.remove(key)
+        else:
+            texts[key] = "host-{:04d}.{}".format(rnd.randrange(1000), rnd.choice(("dc1", "dc2", "lab")))
+            index.set_text(key, texts[key])
+
+    for query in queries + ["host-0", "ab"]:
+        assert index.find(query) == {key for key, text in texts.items() if query in text}, query
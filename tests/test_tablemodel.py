@@ -0,0 +1,69 @@
+# coding: utf-8
+"""
+Tests of the column-oriented table model.
+"""
+import random
+
+from sugarui.widgets.tablemodel import Column, TableModel
+
+
+def get_model(monkeypatch, rows, changes):
+    """
+    Get model, sorting in the background, which rows are changed while the order is computed.
+
+    :param monkeypatch: pytest monkeypatch fixture
+    :param rows: list of (host, online, serial) tuples
+    :param changes: callable, accepting the model and changing it, called while each order is computed
+    :return: TableModel, sorted by the serial, with "computed" counter of the computed orders
+    """
+    model = TableModel([Column("Host"), Column("Online"), Column("Serial", "q")], key=lambda row: row[0])
+    model.extend(rows)
+    model.sort_by(2).result()  # Small table is sorted right away
+    model.computed = 0
+    monkeypatch.setattr(model, "SORT_THRESHOLD", 0)
+    compute_order = model._compute_order
+
+    def compute(track=False):
+        out = compute_order(track=track)
+        model.computed += 1
+        changes(model)
+        return out
+
+    monkeypatch.setattr(model, "_compute_order", compute)
+    return model
+
+
+def get_rows(rnd, count, start=0) -> list:
+    """
+    Get random rows.
+
+    :param rnd: random generator
+    :param count: number of the rows
+    :param start: serial number of the first row
+    :return: list of (host, online, serial) tuples
+    """
+    return [("host-{:05d}".format(rnd.randrange(100000)) + str(idx), rnd.choice(("yes", "no")), rnd.randrange(50))
+            for idx in range(start, start + count)]
+
+
+def test_rows_changed_while_sorting_are_merged(monkeypatch):
+    """
+    Order is applied once, even if the rows are changed on every computation,
+    and it is the same as if it was computed for the changed rows.
+    """
+    rnd = random.Random(1)
+    rows = get_rows(rnd, 2000)
+
+    def churn(model):
+        keys = [model.get_key(position) for position in rnd.sample(range(len(model)), 60)]
+        model.upsert([(key, rnd.choice(("yes", "no")), rnd.randrange(50)) for key in keys[:40]] +
+                     get_rows(rnd, 10, start=len(rows) + model.computed * 10), removed=keys[40:])
+
+    model = get_model(monkeypatch, rows, churn)
+    model.sort_by(1, reverse=True).result(timeout=10)
+
+    assert model.computed == 1
+    expected = sorted(zip(*(model.get_column(column) for column in range(3))), key=lambda row: row[2])
+    expected.sort(key=lambda row: row[1], reverse=True)
+    assert model.get_range(0, len(model)) == expected
+    assert all(model.get_position(model.get_index(position)) == position for position in range(len(model)))